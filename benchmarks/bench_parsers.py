@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+
+# Offline parser benchmark. Times every page parser against the pages in benchmarks/fixtures and
+# reports pages/sec, microseconds per page, peak memory allocated while parsing one page and the
+# allocations still alive afterwards.
+#
+# The fixtures are synthetic pages built from the site's markup: full-size documents with the
+# head, inline scripts/styles, menus, related listings and footer around the parts the parsers
+# read. Pages saved from the live site can be benchmarked instead with --fixtures DIR, using the
+# same file names.
+#
+# Two checks fail the run (exit 1):
+#   - the lxml parser of a page must be at least --min-speedup times faster than the
+#     BeautifulSoup one, measured in the same run, so it holds on any machine
+#   - with benchmarks/baseline.json present, the lxml cases must keep their speedup over bs4,
+#     peak memory and retained allocations within --threshold of the baseline. Only measures that
+#     don't depend on the machine are stored, so the baseline holds on any machine; absolute
+#     times are reported but never gated.
+#
+#   python benchmarks/bench_parsers.py --save      # rewrite benchmarks/baseline.json
+#   python benchmarks/bench_parsers.py             # compare against it
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from scrapper import parsers, fast_parsers  # noqa: E402
+from scrapper.fetcher import Response  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+BASE_URL = 'https://ibay.com.mv'
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def response(name):
+    return Response(f"{BASE_URL}/{name}", 200, {}, fixture(name))
+
+
+# (case name, callable) pairs. Each case parses exactly one page.
+def cases():
+    listing = fixture('search_listing.html')
+    listing_empty = fixture('search_listing_empty.html')
+    detail = response('detail.html')
+    disabled = response('detail_disabled.html')
+    not_found = response('detail_not_found.html')
+    seller = fixture('seller_profile.html')
+    category_page = fixture('category_page.html').decode()
+    cat_ajax = fixture('cat_ajax.json')
+
+    return [
+        # Search listing pages (CategoryProductLinkScraper and ProductUpdater, via PagePlanner)
+        ('listing_page[bs4]', lambda: parsers.parse_listing_page_bs4(listing, BASE_URL)),
+        ('listing_page[lxml]', lambda: fast_parsers.parse_listing_page(listing, BASE_URL)),
+        ('listing_page_empty[bs4]', lambda: parsers.parse_listing_page_bs4(listing_empty, BASE_URL)),
+        ('listing_page_empty[lxml]', lambda: fast_parsers.parse_listing_page(listing_empty, BASE_URL)),
+        # ProductDetailScraper.get_product_details
+        ('product_page[bs4]', lambda: parsers.parse_product_page_bs4(detail.content)),
+        ('product_page[lxml]', lambda: fast_parsers.parse_product_page(detail.content)),
+        ('product_page_disabled[bs4]', lambda: parsers.parse_product_page_bs4(disabled.content)),
+        ('product_page_disabled[lxml]', lambda: fast_parsers.parse_product_page(disabled.content)),
+        ('product_page_not_found[bs4]', lambda: parsers.parse_product_page_bs4(not_found.content)),
+        ('product_page_not_found[lxml]', lambda: fast_parsers.parse_product_page(not_found.content)),
+        # SellerScraper
+        ('seller_page[bs4]', lambda: parsers.parse_seller_page_bs4(seller, 76650)),
+        ('seller_page[lxml]', lambda: fast_parsers.parse_seller_page(seller, 76650)),
+        # ProductCountScraper
+        ('product_count[bs4]', lambda: parsers.parse_product_count_bs4(category_page)),
+        ('product_count[lxml]', lambda: fast_parsers.parse_product_count(category_page)),
+        # CategoryScraper
+        ('cat_ajax', lambda: parsers.parse_categories(cat_ajax)),
+    ]
+
+
+def time_per_page(fn, duration):
+    iterations = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        iterations += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return elapsed / iterations
+
+
+def measure(fn, min_time):
+    # Warm up, then run until min_time has elapsed
+    fn()
+    seconds_per_page = time_per_page(fn, min_time)
+
+    # Allocations are counted on separate runs so tracing doesn't distort the timings. They vary a
+    # little from run to run (interpreter caches), so keep the lowest of a few.
+    peak, retained = min(trace_allocations(fn) for _ in range(5))
+
+    us_per_page = seconds_per_page * 1e6
+    return {
+        'pages_per_sec': round(1e6 / us_per_page, 1),
+        'us_per_page': round(us_per_page, 1),
+        'peak_bytes_per_page': peak,
+        'retained_allocations_per_page': retained
+    }
+
+
+def trace_allocations(fn):
+    # (peak bytes allocated while parsing one page, allocations still alive afterwards)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    start_size, _ = tracemalloc.get_traced_memory()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    del result
+    return peak - start_size, retained
+
+
+def measure_speedup(slow, fast, min_time, rounds=10):
+    # Time the two parsers of a page in alternating short rounds and take the median ratio, so load
+    # changes on the machine hit both sides alike
+    ratios = [time_per_page(slow, min_time / rounds) / time_per_page(fast, min_time / rounds)
+              for _ in range(rounds)]
+    return round(statistics.median(ratios), 1)
+
+
+def check_outputs():
+    # The lxml and BeautifulSoup parsers must agree on every fixture before timings mean anything
+    detail_names = ['detail.html', 'detail_disabled.html', 'detail_not_found.html']
+    pairs = [(parsers.parse_listing_page_bs4, fast_parsers.parse_listing_page, (fixture(name), BASE_URL))
+             for name in ['search_listing.html', 'search_listing_empty.html']]
+    pairs += [(parsers.parse_product_page_bs4, fast_parsers.parse_product_page, (fixture(name),))
+              for name in detail_names]
+    pairs.append((parsers.parse_seller_page_bs4, fast_parsers.parse_seller_page, (fixture('seller_profile.html'), 1)))
+    pairs.append((parsers.parse_product_count_bs4, fast_parsers.parse_product_count,
+                  (fixture('category_page.html').decode(),)))
+
+    mismatches = 0
+    for bs4_version, lxml_version, args in pairs:
+        if bs4_version(*args) != lxml_version(*args):
+            print(f"Output mismatch: {lxml_version.__name__}")
+            mismatches += 1
+    return mismatches
+
+
+# Baseline comparisons for the lxml cases: (result key, column label, absolute change ignored as
+# noise, True when lower is worse)
+COMPARED = [('speedup', 'speedup over bs4', 0, True), ('peak_bytes_per_page', 'peak memory', 1024, False),
+            ('retained_allocations_per_page', 'retained allocations', 20, False)]
+
+
+def compare(name, result, baseline, threshold):
+    # Metrics that got worse by more than threshold against the baseline (and more than the noise floor)
+    regressed = []
+    for key, label, noise, lower_is_worse in COMPARED:
+        if key not in result or key not in baseline:
+            continue
+        before, after = baseline[key], result[key]
+        worse = before - after if lower_is_worse else after - before
+        if worse > max(before * threshold, noise):
+            regressed.append(f"{name} {label} {before} -> {after}")
+    return regressed
+
+
+def check_speedups(results, min_speedup):
+    # The lxml fast path has to beat BeautifulSoup on the same pages by min_speedup
+    return [f"{name} only {result['speedup']}x faster than bs4" for name, result in results.items()
+            if result.get('speedup', min_speedup) < min_speedup]
+
+
+def baseline_entry(result):
+    # The machine-independent part of an lxml result
+    return {key: result[key] for key, _, _, _ in COMPARED if key in result}
+
+
+def main():
+    global FIXTURES
+    parser = argparse.ArgumentParser(description="Offline parser benchmarks")
+    parser.add_argument('--save', action='store_true', help="write results to benchmarks/baseline.json")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed loss of speedup or growth in memory against the baseline (default 0.25 = 25%%)")
+    parser.add_argument('--min-speedup', type=float, default=2.0,
+                        help="required lxml speedup over bs4 on each page (default 2.0)")
+    parser.add_argument('--min-time', type=float, default=0.5, help="seconds to run each case")
+    parser.add_argument('--filter', default='', help="only run cases containing this text")
+    parser.add_argument('--fixtures', default=FIXTURES, help="directory of pages to parse")
+    args = parser.parse_args()
+    FIXTURES = args.fixtures
+
+    if check_outputs():
+        sys.exit(1)
+
+    baseline = {}
+    if os.path.exists(BASELINE) and not args.save:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print(f"{'case':<40}{'pages/s':>12}{'us/page':>12}{'peak KiB':>10}{'retained':>10}{'speedup':>10}")
+    all_cases = dict(cases())
+    for name, fn in all_cases.items():
+        if args.filter not in name:
+            continue
+        result = measure(fn, args.min_time)
+        results[name] = result
+
+        bs4_name = name.replace('[lxml]', '[bs4]')
+        if name.endswith('[lxml]') and bs4_name in all_cases:
+            result['speedup'] = measure_speedup(all_cases[bs4_name], fn, args.min_time)
+        if name.endswith('[lxml]') and name in baseline:
+            regressions += compare(name, result, baseline[name], args.threshold)
+        speedup = f"{result['speedup']}x" if 'speedup' in result else ''
+        print(f"{name:<40}{result['pages_per_sec']:>12}{result['us_per_page']:>12}"
+              f"{result['peak_bytes_per_page'] / 1024:>10.1f}{result['retained_allocations_per_page']:>10}{speedup:>10}")
+
+    if args.save:
+        with open(BASELINE, 'w') as f:
+            json.dump({name: baseline_entry(result) for name, result in results.items() if name.endswith('[lxml]')},
+                      f, indent=2, sort_keys=True)
+        print(f"Baseline written to {BASELINE}")
+
+    failures = check_speedups(results, args.min_speedup)
+    if failures:
+        print(f"Below the required {args.min_speedup}x speedup: {'; '.join(failures)}")
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0%}: {'; '.join(regressions)}")
+    if failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
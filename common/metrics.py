@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process metrics shared by every stage: counters, latency histograms and gauges, keyed by
+# name plus labels. Recording is a dict update under one lock, cheap enough for the hot path.
+# Export either as Prometheus text over HTTP (METRICS_PORT) or as periodic JSON snapshots
+# (METRICS_SNAPSHOT_PATH). Work done inside parse worker processes is not counted.
+
+# Upper bounds in seconds; covers sub-millisecond parses up to slow page loads
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_gauges = {}
+_gauge_callbacks = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0}
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][index] += 1
+                break
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def register_gauge(name, callback, **labels):
+    # callback() is read at export time, e.g. a queue's qsize
+    with _lock:
+        _gauge_callbacks[_key(name, labels)] = callback
+
+
+def unregister_gauge(name, **labels):
+    with _lock:
+        _gauge_callbacks.pop(_key(name, labels), None)
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def _read_gauges():
+    with _lock:
+        gauges = dict(_gauges)
+        callbacks = list(_gauge_callbacks.items())
+    for key, callback in callbacks:
+        try:
+            gauges[key] = callback()
+        except Exception:
+            pass
+    return gauges
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+def render_prometheus():
+    # Prometheus text exposition format
+    gauges = _read_gauges()
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {'buckets': list(value['buckets']), 'count': value['count'], 'sum': value['sum']}
+                      for key, value in _histograms.items()}
+
+    lines = []
+    for kind, series in (('counter', counters), ('gauge', gauges)):
+        for name in sorted({name for name, _ in series}):
+            lines.append(f"# TYPE {name} {kind}")
+            for (series_name, labels), value in sorted(series.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (series_name, labels), histogram in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot():
+    # JSON-friendly view: counters and gauges by series, histograms with count/sum/mean
+    def series(name, labels):
+        return name + _labels(labels)
+
+    gauges = _read_gauges()
+    with _lock:
+        return {
+            'time': time.time(),
+            'counters': {series(name, labels): value for (name, labels), value in _counters.items()},
+            'gauges': {series(name, labels): value for (name, labels), value in gauges.items()},
+            'histograms': {
+                series(name, labels): {
+                    'count': value['count'],
+                    'sum': round(value['sum'], 6),
+                    'mean': round(value['sum'] / value['count'], 6) if value['count'] else None,
+                    'buckets': dict(zip(map(str, BUCKETS), value['buckets']))
+                }
+                for (name, labels), value in _histograms.items()
+            }
+        }
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/metrics.json'):
+            body, content_type = json.dumps(snapshot()).encode(), 'application/json'
+        elif self.path.startswith('/metrics'):
+            body, content_type = render_prometheus().encode(), 'text/plain; version=0.0.4'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, host='0.0.0.0'):
+    # Serve /metrics (Prometheus text) and /metrics.json from a daemon thread
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    print(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def start_snapshot_writer(path, interval=60.0):
+    # Rewrite path with a JSON snapshot every interval seconds from a daemon thread
+    def run():
+        while True:
+            time.sleep(interval)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(snapshot(), f, indent=2, sort_keys=True)
+            os.replace(path + '.tmp', path)
+
+    thread = threading.Thread(target=run, name='metrics-snapshot', daemon=True)
+    thread.start()
+    return thread
+
+
+_started = False
+
+
+def start_from_env():
+    # METRICS_PORT and/or METRICS_SNAPSHOT_PATH turn exporting on; safe to call more than once
+    global _started
+    if _started:
+        return
+    _started = True
+    if os.getenv('METRICS_PORT'):
+        start_http_server(int(os.getenv('METRICS_PORT')))
+    if os.getenv('METRICS_SNAPSHOT_PATH'):
+        start_snapshot_writer(os.getenv('METRICS_SNAPSHOT_PATH'), float(os.getenv('METRICS_SNAPSHOT_INTERVAL', 60)))
+
+
+# Worker-thread profiles collected for the profiled() block in progress: {thread name: [Profile]}
+_thread_profiles = None
+_thread_profiles_lock = threading.Lock()
+
+
+@contextmanager
+def profiled(name):
+    # With PROFILE=1, run the block under cProfile and write <PROFILE_DIR>/<name>.prof plus the
+    # top functions by cumulative time. Worker threads started through profile_thread() are
+    # profiled too: each gets <name>.<thread>.prof and is merged into <name>.prof.
+    global _thread_profiles
+    if os.getenv('PROFILE', '0') not in ('1', 'true', 'on'):
+        yield
+        return
+    directory = os.getenv('PROFILE_DIR', '.')
+    os.makedirs(directory, exist_ok=True)
+    with _thread_profiles_lock:
+        _thread_profiles = {}
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _thread_profiles_lock:
+            threads, _thread_profiles = _thread_profiles, None
+        stats = pstats.Stats(profiler)
+        for thread_name, profilers in sorted(threads.items()):
+            path = os.path.join(directory, f"{name}.{thread_name}.prof")
+            pstats.Stats(*profilers).dump_stats(path)
+            print(f"Profile written to {path}")
+            stats.add(*profilers)
+        path = os.path.join(directory, f"{name}.prof")
+        stats.dump_stats(path)
+        print(f"Profile written to {path}")
+        stats.sort_stats('cumulative').print_stats(20)
+
+
+def profile_thread(target):
+    # Wrap a thread target so that, while a profiled() block is running, the thread is profiled
+    # and its stats are handed to that block when the target returns
+    def run(*args, **kwargs):
+        if _thread_profiles is None:
+            return target(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process, and it already sees every thread
+            return target(*args, **kwargs)
+        try:
+            return target(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with _thread_profiles_lock:
+                if _thread_profiles is not None:
+                    _thread_profiles.setdefault(threading.current_thread().name, []).append(profiler)
+    return run
@@ -0,0 +1,70 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+# Shared runtime context: configuration read once, plus the process-wide DB pool and HTTP
+# fetcher that every scraper reuses. Heavy modules (psycopg2, aiohttp) are only imported when
+# a stage first asks for the resource, so short jobs and --help start fast.
+
+# Close enough to process start for measuring how long a stage takes to get going
+PROCESS_START = time.perf_counter()
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+
+class Runtime:
+    def __init__(self):
+        self.base_url = os.getenv('BASE_URL', 'https://ibay.com.mv').rstrip('/')
+        self.user_agent = os.getenv('USER_AGENT')
+        self.startup_seconds = None
+
+    # Every model and scraper gets the pool and fetcher from here
+    @property
+    def pool(self):
+        from models.base_model import get_pool
+        return get_pool()
+
+    @property
+    def fetcher(self):
+        from scrapper.fetcher import get_fetcher
+        return get_fetcher()
+
+    def warm(self, fetcher=True):
+        # Open the DB pool, check the schema and start the fetcher up front, then record how long
+        # the process took to become ready for work
+        from models.base_model import ensure_schema
+        from common import metrics
+        ensure_schema()
+        if fetcher:
+            self.fetcher
+        if self.startup_seconds is None:
+            self.startup_seconds = time.perf_counter() - PROCESS_START
+            metrics.set_gauge('startup_seconds', round(self.startup_seconds, 4))
+            print(f"Ready in {self.startup_seconds:.2f}s")
+
+    def close(self):
+        # Only tear down what was actually started
+        import sys
+        if 'scrapper.fetcher' in sys.modules:
+            sys.modules['scrapper.fetcher'].close_fetcher()
+        if 'models.base_model' in sys.modules:
+            sys.modules['models.base_model'].close_pool()
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime():
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = Runtime()
+        return _runtime
+
+
+def close_runtime():
+    with _runtime_lock:
+        if _runtime is not None:
+            _runtime.close()
@@ -0,0 +1,80 @@
+import time
+import threading
+from datetime import datetime, timedelta
+from common import metrics
+
+
+class Job:
+    # A recurring job: every `interval` seconds, or once a day at `at` ("HH:MM", local time)
+    def __init__(self, name, fn, interval=None, at=None, run_at_start=False):
+        if (interval is None) == (at is None):
+            raise ValueError("Job needs exactly one of interval or at")
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.at = at
+        self.lock = threading.Lock()
+        self.next_run = time.time() if run_at_start else self._following(time.time())
+
+    def _following(self, now):
+        if self.interval is not None:
+            return now + self.interval
+        hour, minute = map(int, self.at.split(':'))
+        current = datetime.fromtimestamp(now)
+        target = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= current:
+            target += timedelta(days=1)
+        return target.timestamp()
+
+    def schedule_next(self):
+        self.next_run = self._following(time.time())
+
+
+class Scheduler:
+    # Runs jobs on their schedules in one long-lived process. Each run gets its own thread, and a
+    # job whose previous run hasn't finished is skipped for that tick instead of overlapping it.
+    def __init__(self, jobs, tick=1.0):
+        self.jobs = jobs
+        self.tick = tick
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def _run(self, job):
+        start = time.perf_counter()
+        try:
+            print(f"[{job.name}] started")
+            job.fn()
+            print(f"[{job.name}] finished in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"[{job.name}] failed after {time.perf_counter() - start:.1f}s: {e!r}")
+        finally:
+            job.lock.release()
+
+    def run_forever(self):
+        for job in self.jobs:
+            print(f"Scheduled {job.name}: next run {datetime.fromtimestamp(job.next_run):%Y-%m-%d %H:%M:%S}")
+        try:
+            while not self.stop_event.is_set():
+                now = time.time()
+                for job in self.jobs:
+                    if job.next_run > now:
+                        continue
+                    job.schedule_next()
+                    if not job.lock.acquire(blocking=False):
+                        print(f"[{job.name}] still running, skipping this run")
+                        continue
+                    thread = threading.Thread(target=metrics.profile_thread(self._run), args=(job,), name=f'job-{job.name}')
+                    thread.start()
+                    self.threads.append(thread)
+                self.threads = [thread for thread in self.threads if thread.is_alive()]
+                self.stop_event.wait(self.tick)
+        except KeyboardInterrupt:
+            self.stop()
+
+        # Let running jobs finish before the caller tears down shared resources
+        print("Scheduler stopping; waiting for running jobs to finish")
+        for thread in self.threads:
+            thread.join()
+
+    def stop(self):
+        self.stop_event.set()
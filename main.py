@@ -1,9 +1,11 @@
-from scrapper.category_scrapper import CategoryScraper
-from scrapper.product_count_scraper import ProductCountScraper
-from scrapper.category_product_link_scrapper import CategoryProductLinkScraper
-from scrapper.product_detail_scraper import ProductDetailScraper
-from scrapper.seller_scraper import SellerScraper
-from scrapper.product_updater import ProductUpdater
+from common.runtime import get_runtime, close_runtime
+from common import metrics
+from common.scheduler import Job, Scheduler
+import sys
+import signal
+import argparse
+
+# Stage modules pull in aiohttp, psycopg2 and lxml, so each command imports only the stage it runs
 
 
 def main_menu():
@@ -14,46 +16,251 @@ def main_menu():
     print("4. Scrape Product Details")
     print("5. Scrape Seller Information")
     print("6. Scrape New Products")
-    print("7. Exit")
+    print("7. Run Full Pipeline")
+    print("8. Exit")
 
 def main():
+    metrics.start_from_env()
     while True:
         main_menu()
-        choice = input("Enter your choice (1-7): ")
-        
-        if choice == '1':
-            category_scraper = CategoryScraper()
-            category_scraper.run()
-            category_scraper.close()
-        elif choice == '2':
-            count_scraper = ProductCountScraper()
-            count_scraper.run()
-            count_scraper.close()
-        elif choice == '3':
-            link_scraper = CategoryProductLinkScraper()
-            link_scraper.run()
-            link_scraper.close()
-            pass
-        elif choice == '4':
-            details_scraper = ProductDetailScraper()
-            details_scraper.run()
-            details_scraper.close()
-            pass
-        elif choice == '5':
-            seller_scraper = SellerScraper()
-            seller_scraper.run()
-            seller_scraper.close()
-            pass
-        elif choice == '6':
-            updater = ProductUpdater()
-            updater.run(days=3)
-            updater.close()
-            pass
-        elif choice == '7':
-            print("Exiting the program.")
+        choice = input("Enter your choice (1-8): ")
+        with metrics.profiled(f"menu-{choice}"):
+            run_choice(choice)
+        if choice == '8':
             break
-        else:
-            print("Invalid choice. Please enter a number between 1 and 6.")
+
+
+def run_choice(choice):
+    if choice == '1':
+        from scrapper.category_scrapper import CategoryScraper
+        category_scraper = CategoryScraper()
+        category_scraper.run()
+        category_scraper.close()
+    elif choice == '2':
+        from scrapper.product_count_scraper import ProductCountScraper
+        count_scraper = ProductCountScraper()
+        count_scraper.run()
+        count_scraper.close()
+    elif choice == '3':
+        from scrapper.category_product_link_scrapper import CategoryProductLinkScraper
+        link_scraper = CategoryProductLinkScraper()
+        link_scraper.run()
+        link_scraper.close()
+        pass
+    elif choice == '4':
+        from scrapper.product_detail_scraper import ProductDetailScraper
+        details_scraper = ProductDetailScraper()
+        details_scraper.run()
+        details_scraper.close()
+        pass
+    elif choice == '5':
+        from scrapper.seller_scraper import SellerScraper
+        seller_scraper = SellerScraper()
+        seller_scraper.run()
+        seller_scraper.close()
+        pass
+    elif choice == '6':
+        from scrapper.product_updater import ProductUpdater
+        updater = ProductUpdater()
+        updater.run(days=3)
+        updater.close()
+        pass
+    elif choice == '7':
+        from scrapper.pipeline import Pipeline
+        pipeline = Pipeline()
+        pipeline.run()
+        pipeline.close()
+    elif choice == '8':
+        print("Exiting the program.")
+        close_runtime()
+    else:
+        print("Invalid choice. Please enter a number between 1 and 8.")
+
+# Non-interactive entry point: `python main.py <command> [options]`. Without a command the
+# interactive menu above is shown.
+def run_categories(args):
+    from scrapper.category_scrapper import CategoryScraper
+    scraper = CategoryScraper()
+    scraper.run()
+    scraper.close()
+
+
+def run_counts(args):
+    from scrapper.product_count_scraper import ProductCountScraper
+    scraper = ProductCountScraper()
+    scraper.run()
+    scraper.close()
+
+
+def run_links(args):
+    from scrapper.category_product_link_scrapper import CategoryProductLinkScraper
+    scraper = CategoryProductLinkScraper()
+    if args.probe_window:
+        scraper.max_workers = args.probe_window
+    if args.category_id:
+        for category_id in args.category_id:
+            product_count = scraper.category_model.get_product_count(category_id)
+            scraper.process_products({'id': category_id, 'name': str(category_id), 'product_count': product_count})
+    else:
+        scraper.run(resume=not args.no_resume)
+    scraper.close()
+
+
+def run_details(args):
+    from scrapper.product_detail_scraper import ProductDetailScraper
+    scraper = ProductDetailScraper(parse_workers=args.parse_workers)
+    if args.max_pending:
+        scraper.max_pending = args.max_pending
+    scraper.run(batch_size=args.batch_size, flush_interval=args.flush_interval, leased=args.leased,
+                status=args.status)
+    scraper.close()
+
+
+def run_sellers(args):
+    from scrapper.seller_scraper import SellerScraper
+    scraper = SellerScraper(parse_workers=args.parse_workers)
+    if args.max_pending:
+        scraper.max_pending = args.max_pending
+    if args.batch_size:
+        scraper.batch_size = args.batch_size
+    scraper.run(leased=args.leased, incremental=args.incremental, max_age_hours=args.max_age_hours)
+    scraper.close()
+
+
+def run_update(args):
+    from scrapper.product_updater import ProductUpdater
+    updater = ProductUpdater()
+    if args.probe_window:
+        updater.max_workers = args.probe_window
+    if args.incremental:
+        updater.run(category_id=args.category_id, incremental=True, max_pages=args.max_pages)
+    else:
+        updater.run(category_id=args.category_id, days=args.days)
+    updater.close()
+
+
+def run_refresh(args):
+    from scrapper.refresh_scheduler import RefreshScheduler
+    scheduler = RefreshScheduler(batch_size=args.batch_size, min_interval_hours=args.min_interval_hours)
+    scheduler.run(budget=args.budget)
+    scheduler.close()
+
+
+def run_pipeline(args):
+    from scrapper.pipeline import Pipeline
+    pipeline = Pipeline(link_workers=args.link_workers, detail_workers=args.detail_workers,
+                        seller_workers=args.seller_workers, queue_size=args.queue_size,
+                        refresh_categories=args.refresh_categories)
+    pipeline.run()
+    pipeline.close()
+
+
+def run_job(argv):
+    # Run one command inside the daemon, with the same defaults as on the command line
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+def run_daemon(args):
+    # One warm process runs every recurring job, sharing the HTTP client, DB pool and id caches
+    jobs = [
+        Job('update', lambda: run_job(['update', '--incremental']), interval=args.update_minutes * 60,
+            run_at_start=True),
+        Job('details', lambda: run_job(['details', '--leased']), interval=args.details_minutes * 60,
+            run_at_start=True),
+        Job('counts', lambda: run_job(['counts']), interval=args.counts_minutes * 60),
+        Job('sellers', lambda: run_job(['sellers', '--incremental']), at=args.sellers_at),
+    ]
+    if args.refresh_minutes:
+        jobs.append(Job('refresh', lambda: run_job(['refresh', '--budget', str(args.refresh_budget)]),
+                        interval=args.refresh_minutes * 60))
+
+    scheduler = Scheduler(jobs)
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+    scheduler.run_forever()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Ibay Scrapper")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    command = commands.add_parser('categories', help="scrape the category tree")
+    command.set_defaults(func=run_categories)
+
+    command = commands.add_parser('counts', help="scrape product counts per category")
+    command.set_defaults(func=run_counts)
+
+    command = commands.add_parser('links', help="scrape product links of every parent category")
+    command.add_argument('--category-id', type=int, action='append', help="only this category (repeatable)")
+    command.add_argument('--no-resume', action='store_true', help="start a new run instead of resuming")
+    command.add_argument('--probe-window', type=int, help="pages probed past the last full page")
+    command.set_defaults(func=run_links)
+
+    command = commands.add_parser('details', help="scrape product detail pages")
+    command.add_argument('--status', default='NOT_SCRAPED', help="products to scrape (SCRAPED re-scrapes)")
+    command.add_argument('--leased', action='store_true', help="claim work so several processes can share it")
+    command.add_argument('--max-pending', type=int, help="detail pages in flight")
+    command.add_argument('--parse-workers', type=int, help="parse process pool size (0 = inline)")
+    command.add_argument('--batch-size', type=int, help="products written per transaction")
+    command.add_argument('--flush-interval', type=float, help="seconds before a partial batch is written")
+    command.set_defaults(func=run_details)
+
+    command = commands.add_parser('sellers', help="scrape seller profiles")
+    command.add_argument('--incremental', action='store_true', help="only new or stale sellers")
+    command.add_argument('--max-age-hours', type=float, help="staleness for --incremental")
+    command.add_argument('--leased', action='store_true', help="claim work so several processes can share it")
+    command.add_argument('--max-pending', type=int, help="seller pages in flight")
+    command.add_argument('--parse-workers', type=int, help="parse process pool size (0 = inline)")
+    command.add_argument('--batch-size', type=int, help="sellers written per statement")
+    command.set_defaults(func=run_sellers)
+
+    command = commands.add_parser('update', help="scrape new products")
+    command.add_argument('--category-id', type=int)
+    command.add_argument('--days', type=int, default=3, help="listings from the last N days (default 3)")
+    command.add_argument('--incremental', action='store_true', help="stop at already stored listings")
+    command.add_argument('--max-pages', type=int, help="page cap for --incremental")
+    command.add_argument('--probe-window', type=int, help="pages kept in flight past the last full page")
+    command.set_defaults(func=run_update)
+
+    command = commands.add_parser('refresh', help="re-scrape the products most likely to have changed")
+    command.add_argument('--budget', type=int, help="maximum products to refresh")
+    command.add_argument('--batch-size', type=int)
+    command.add_argument('--min-interval-hours', type=float)
+    command.set_defaults(func=run_refresh)
+
+    command = commands.add_parser('pipeline', help="stream links, details and sellers together")
+    command.add_argument('--link-workers', type=int)
+    command.add_argument('--detail-workers', type=int)
+    command.add_argument('--seller-workers', type=int)
+    command.add_argument('--queue-size', type=int)
+    command.add_argument('--refresh-categories', action='store_true', help="re-scrape the category tree first")
+    command.set_defaults(func=run_pipeline)
+
+    command = commands.add_parser('daemon', help="run recurring jobs in one long-lived process")
+    command.add_argument('--update-minutes', type=float, default=5, help="incremental new-product updates")
+    command.add_argument('--details-minutes', type=float, default=15, help="detail scraping of new listings")
+    command.add_argument('--counts-minutes', type=float, default=60, help="category product counts")
+    command.add_argument('--sellers-at', default='03:00', help="daily incremental seller pass (HH:MM)")
+    command.add_argument('--refresh-minutes', type=float, default=0, help="refresh of changed products (0 = off)")
+    command.add_argument('--refresh-budget', type=int, default=5000)
+    command.set_defaults(func=run_daemon)
+    return parser
+
+
+def cli(argv):
+    args = build_parser().parse_args(argv)
+    metrics.start_from_env()
+    try:
+        # Open the DB pool, check the schema and start the HTTP client once, before any stage runs
+        get_runtime().warm()
+        with metrics.profiled(args.command):
+            args.func(args)
+    finally:
+        close_runtime()
+
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1:
+        cli(sys.argv[1:])
+    else:
+        main()
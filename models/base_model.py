@@ -1,97 +1,132 @@
+import io
 import os
-import psycopg2
-from dotenv import load_dotenv
+import threading
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
+from models.migrations import migrate
+from common import metrics
+from common.runtime import get_runtime
+
+_pool = None
+_pool_lock = threading.Lock()
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    # ThreadedConnectionPool raises once maxconn connections are out; wait for one instead
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        self._slots.acquire()
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+def get_pool():
+    # Process-wide connection pool shared by every model
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = BlockingConnectionPool(
+                int(os.getenv('DB_POOL_MIN', 1)),
+                int(os.getenv('DB_POOL_MAX', 20)),
+                dbname=os.getenv('DB_NAME'),
+                user=os.getenv('DB_USER'),
+                password=os.getenv('DB_PASSWORD'),
+                host=os.getenv('DB_HOST'),
+                port=os.getenv('DB_PORT')
+            )
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+
+def ensure_schema():
+    # Apply pending migrations once per process, on a connection borrowed from the shared pool
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            migrate(conn)
+        finally:
+            if not conn.closed:
+                conn.rollback()
+            pool.putconn(conn, close=bool(conn.closed))
+        _schema_ready = True
+
+
+def _copy_value(value):
+    # Escape a value for COPY text format; None becomes NULL
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
 
 class BaseModel:
     def __init__(self):
-        # Load environment variables from .env file
-        dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
-        load_dotenv(dotenv_path)
-    
-        # Establish a connection to the PostgreSQL database
-        self.conn = psycopg2.connect(
-            dbname=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            host=os.getenv('DB_HOST'),
-            port=os.getenv('DB_PORT')
-        )
+        self.pool = get_runtime().pool
 
         # Create necessary tables if they don't exist
         self.create_table()
-        
+
+    @contextmanager
+    def connection(self):
+        # Borrow a pooled connection for one unit of work. Anything left uncommitted is
+        # rolled back before the connection goes back, so threads never see each other's state.
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            if not conn.closed:
+                conn.rollback()
+            self.pool.putconn(conn, close=bool(conn.closed))
+
     def execute_query(self, query, params=None, commit=False):
         # Execute a SQL query with optional parameters and commit flag
-        with self.conn.cursor() as cursor:
-            cursor.execute(query, params)
-            if commit:
-                self.conn.commit()
-            if query.strip().upper().startswith("SELECT"):
-                return cursor.fetchall()
+        statement = query.split(None, 1)[0].upper() if query.strip() else ''
+        with metrics.timer('db_query_seconds', statement=statement), self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                if commit:
+                    conn.commit()
+                if query.strip().upper().startswith("SELECT"):
+                    return cursor.fetchall()
+
+    def copy_rows(self, cursor, table, columns, rows):
+        # Stream rows into a table with COPY FROM STDIN (text format)
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
 
     def create_table(self):
-        # Create tables for categories, sellers, products, product_categories, product_images, and product_info
-        self.execute_query('''
-                CREATE TABLE IF NOT EXISTS categories (
-                    id SERIAL PRIMARY KEY,
-                    name TEXT,
-                    parent_id INTEGER,
-                    product_count INTEGER DEFAULT 0,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                CREATE TABLE IF NOT EXISTS sellers (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT,
-                    contact_number TEXT,
-                    image_src TEXT,
-                    is_premium BOOLEAN DEFAULT FALSE,
-                    description TEXT,
-                    location TEXT,
-                    member_since DATE,
-                    last_login DATE,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                CREATE TABLE IF NOT EXISTS products (
-                    id SERIAL PRIMARY KEY,
-                    name TEXT,
-                    url TEXT,
-                    listing_id INTEGER UNIQUE,
-                    seller_id INTEGER REFERENCES sellers(id) ON DELETE CASCADE,
-                    price DECIMAL(10,2),
-                    product_location TEXT,
-                    description TEXT,
-                    last_updated DATE,
-                    status VARCHAR(255) DEFAULT 'NOT_SCRAPED',
-                    error_message TEXT,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                CREATE TABLE IF NOT EXISTS product_categories (
-                    product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
-                    category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
-                    PRIMARY KEY (product_id, category_id),
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                CREATE TABLE IF NOT EXISTS product_images (
-                    id SERIAL PRIMARY KEY,
-                    product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
-                    image_url TEXT,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                CREATE TABLE IF NOT EXISTS product_info (
-                    id SERIAL PRIMARY KEY,
-                    product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
-                    info_key TEXT,
-                    info_value TEXT,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-            ''')
+        # Bring the schema up to date. Migrations are checked once per process, not per model.
+        ensure_schema()
     
     def close(self):
-        # Close the database connection
-        self.conn.close()
\ No newline at end of file
+        # Connections belong to the shared pool; call close_pool() once at process exit
+        pass
\ No newline at end of file
@@ -1,4 +1,5 @@
 from models.base_model import BaseModel
+from psycopg2.extras import execute_values
 
 class CategoryModel(BaseModel):
     def insert_category(self, id, name, parent_id):
@@ -6,6 +7,17 @@ class CategoryModel(BaseModel):
         self.execute_query("INSERT INTO categories (id, name, parent_id) VALUES (%s, %s, %s) ON CONFLICT (id) DO NOTHING",
                            (id, name, parent_id), commit=True)
 
+    def upsert_categories(self, categories):
+        # Insert or refresh (id, name, parent_id) rows in one multi-row statement
+        with self.connection() as conn, conn.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO categories (id, name, parent_id) VALUES %s
+                ON CONFLICT (id) DO UPDATE
+                SET name = EXCLUDED.name, parent_id = EXCLUDED.parent_id, updated_at = NOW()
+                WHERE (categories.name, categories.parent_id) IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.parent_id)
+            """, categories, page_size=1000)
+            conn.commit()
+
     def get_all_categories(self):
         # Retrieve all categories from the categories table
         rows = self.execute_query("SELECT id, name FROM categories")
@@ -13,5 +25,17 @@ class CategoryModel(BaseModel):
 
     def get_parent_categories(self):
         # Retrieve parent categories (categories without a parent) from the categories table
-        rows = self.execute_query("SELECT id, name FROM categories WHERE parent_id IS NULL")
-        return [{'id': row[0], 'name': row[1]} for row in rows]
\ No newline at end of file
+        rows = self.execute_query("SELECT id, name, product_count FROM categories WHERE parent_id IS NULL")
+        return [{'id': row[0], 'name': row[1], 'product_count': row[2]} for row in rows]
+
+    def get_product_counts(self, ids):
+        # {id: product_count} for the given categories, in one query
+        if not ids:
+            return {}
+        rows = self.execute_query("SELECT id, product_count FROM categories WHERE id = ANY(%s)", (list(ids),))
+        return {row[0]: row[1] for row in rows}
+
+    def get_product_count(self, id):
+        # Listing count stored by ProductCountScraper, or None if the category is unknown
+        rows = self.execute_query("SELECT product_count FROM categories WHERE id = %s", (id,))
+        return rows[0][0] if rows else None
@@ -0,0 +1,43 @@
+import uuid
+from models.base_model import BaseModel
+
+CATEGORY_DONE = -1
+
+class CheckpointModel(BaseModel):
+    # Progress of long crawls, so a restarted run resumes where the previous one stopped
+    def start_run(self, kind, max_age_hours=None):
+        # Resume the latest unfinished run of this kind started within max_age_hours, or start a new
+        # one. Older unfinished runs are closed so they are never resumed. Returns (run_id, resumed).
+        if max_age_hours:
+            self.execute_query("""
+                UPDATE crawl_runs SET finished_at = NOW()
+                WHERE kind = %s AND finished_at IS NULL AND started_at < NOW() - %s * INTERVAL '1 hour'
+            """, (kind, max_age_hours), commit=True)
+        rows = self.execute_query(
+            "SELECT run_id FROM crawl_runs WHERE kind = %s AND finished_at IS NULL ORDER BY started_at DESC LIMIT 1",
+            (kind,))
+        if rows:
+            return rows[0][0], True
+        run_id = uuid.uuid4().hex
+        self.execute_query("INSERT INTO crawl_runs (run_id, kind) VALUES (%s, %s)", (run_id, kind), commit=True)
+        return run_id, False
+
+    def finish_run(self, run_id):
+        self.execute_query("UPDATE crawl_runs SET finished_at = NOW() WHERE run_id = %s", (run_id,), commit=True)
+
+    def completed_pages(self, run_id):
+        # {category_id: set of pages} stored by the run; CATEGORY_DONE in the set means the whole category
+        rows = self.execute_query("SELECT category_id, page FROM crawl_checkpoints WHERE run_id = %s", (run_id,))
+        pages = {}
+        for category_id, page in rows:
+            pages.setdefault(category_id, set()).add(page)
+        return pages
+
+    def mark_page(self, run_id, category_id, page):
+        self.execute_query("""
+            INSERT INTO crawl_checkpoints (run_id, category_id, page) VALUES (%s, %s, %s)
+            ON CONFLICT DO NOTHING
+        """, (run_id, category_id, page), commit=True)
+
+    def mark_category(self, run_id, category_id):
+        self.mark_page(run_id, category_id, CATEGORY_DONE)
@@ -0,0 +1,13 @@
+from models.base_model import BaseModel
+
+class CrawlStateModel(BaseModel):
+    # Small key/value store for crawl bookmarks such as the updater's listing_id high-water mark
+    def get_state(self, key, default=None):
+        rows = self.execute_query("SELECT value FROM crawl_state WHERE key = %s", (key,))
+        return rows[0][0] if rows else default
+
+    def set_state(self, key, value):
+        self.execute_query("""
+            INSERT INTO crawl_state (key, value) VALUES (%s, %s)
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+        """, (key, str(value)), commit=True)
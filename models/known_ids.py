@@ -0,0 +1,106 @@
+import os
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from common.runtime import get_runtime
+
+
+class KnownIds:
+    # Process-wide set of integer ids known to exist in table.column, used to skip writes for
+    # entities that are already stored. Warm-loaded from the database on first use and kept as a
+    # sorted array of 64-bit ints (8 bytes per id) plus a small set of recent additions that is
+    # merged in periodically. Lookups are exact: a false "known" would drop a write, so there is
+    # no probabilistic mode. Past max_size ids, new ids are no longer cached and simply go to
+    # the database as before.
+    def __init__(self, table, column, max_size=None, chunk_size=50000):
+        self.table = table
+        self.column = column
+        self.max_size = max_size or int(os.getenv('KNOWN_IDS_MAX', 5000000))
+        self.chunk_size = chunk_size
+        self.ids = array('q')
+        self.recent = set()
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _warm(self):
+        # Keyset scan of the column newest-first, straight into the array, so when the table holds
+        # more than max_size ids it is the oldest (coldest) ones that are left out
+        pool = get_runtime().pool
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                last_id = None
+                while len(self.ids) < self.max_size:
+                    cursor.execute(
+                        f"SELECT {self.column} FROM {self.table} "
+                        f"WHERE {self.column} IS NOT NULL AND (%s::bigint IS NULL OR {self.column} < %s) "
+                        f"ORDER BY {self.column} DESC LIMIT %s",
+                        (last_id, last_id, min(self.chunk_size, self.max_size - len(self.ids))))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    self.ids.extend(row[0] for row in rows)
+                    last_id = rows[-1][0]
+            conn.rollback()
+        finally:
+            pool.putconn(conn)
+        self.ids.reverse()
+        self.loaded = True
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self._warm()
+
+    def _contains(self, id):
+        if id in self.recent:
+            return True
+        index = bisect_left(self.ids, id)
+        return index < len(self.ids) and self.ids[index] == id
+
+    def __contains__(self, id):
+        with self.lock:
+            self._ensure_loaded()
+            return self._contains(id)
+
+    def __len__(self):
+        return len(self.ids) + len(self.recent)
+
+    def unknown(self, ids):
+        # The ids (in their original order) that aren't known yet
+        with self.lock:
+            self._ensure_loaded()
+            return [id for id in ids if not self._contains(id)]
+
+    def add(self, ids):
+        # Record ids that are now stored. Call only after the transaction that wrote them committed.
+        with self.lock:
+            # Warm first, or the ids loaded later would duplicate these and overrun max_size
+            self._ensure_loaded()
+            for id in ids:
+                if len(self) >= self.max_size:
+                    break
+                if id is not None and not self._contains(id):
+                    self.recent.add(id)
+            if len(self.recent) > max(4096, len(self.ids) // 8):
+                self.ids = array('q', heapq.merge(self.ids, sorted(self.recent)))
+                self.recent.clear()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def known_seller_ids():
+    return _known('sellers', 'id')
+
+
+def known_listing_ids():
+    return _known('products', 'listing_id')
+
+
+def _known(table, column):
+    with _caches_lock:
+        if (table, column) not in _caches:
+            _caches[(table, column)] = KnownIds(table, column)
+        return _caches[(table, column)]
@@ -0,0 +1,189 @@
+import time
+
+# Versioned schema migrations. Each entry runs once per database, in order, inside its own
+# transaction, and is recorded in schema_migrations. Append new migrations to the end and never
+# edit one that has shipped. The early migrations use IF NOT EXISTS so databases created before
+# the runner existed are adopted without changes.
+MIGRATIONS = [
+    (1, 'initial schema', '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id SERIAL PRIMARY KEY,
+            name TEXT,
+            parent_id INTEGER,
+            product_count INTEGER DEFAULT 0,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS sellers (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            contact_number TEXT,
+            image_src TEXT,
+            is_premium BOOLEAN DEFAULT FALSE,
+            description TEXT,
+            location TEXT,
+            member_since DATE,
+            last_login DATE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS products (
+            id SERIAL PRIMARY KEY,
+            name TEXT,
+            url TEXT,
+            listing_id INTEGER UNIQUE,
+            seller_id INTEGER REFERENCES sellers(id) ON DELETE CASCADE,
+            price DECIMAL(10,2),
+            product_location TEXT,
+            description TEXT,
+            last_updated DATE,
+            status VARCHAR(255) DEFAULT 'NOT_SCRAPED',
+            error_message TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS product_categories (
+            product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+            category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
+            PRIMARY KEY (product_id, category_id),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS product_images (
+            id SERIAL PRIMARY KEY,
+            product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+            image_url TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS product_info (
+            id SERIAL PRIMARY KEY,
+            product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+            info_key TEXT,
+            info_value TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+    '''),
+    (2, 'work leases', '''
+        -- Work leases so several processes can share the detail and seller backlogs
+        ALTER TABLE products
+            ADD COLUMN IF NOT EXISTS lease_owner TEXT,
+            ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;
+        ALTER TABLE sellers
+            ADD COLUMN IF NOT EXISTS lease_owner TEXT,
+            ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;
+    '''),
+    (3, 'content fingerprints', '''
+        -- Content fingerprints and HTTP validators for change detection on re-scrapes
+        ALTER TABLE products
+            ADD COLUMN IF NOT EXISTS content_hash TEXT,
+            ADD COLUMN IF NOT EXISTS etag TEXT,
+            ADD COLUMN IF NOT EXISTS last_modified TEXT,
+            ADD COLUMN IF NOT EXISTS checked_at TIMESTAMP WITH TIME ZONE;
+        ALTER TABLE sellers
+            ADD COLUMN IF NOT EXISTS content_hash TEXT,
+            ADD COLUMN IF NOT EXISTS checked_at TIMESTAMP WITH TIME ZONE;
+    '''),
+    (4, 'scrape history', '''
+        -- Scrape history used to prioritise refreshes
+        ALTER TABLE products
+            ADD COLUMN IF NOT EXISTS check_count INTEGER DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS change_count INTEGER DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS error_count INTEGER DEFAULT 0;
+    '''),
+    (5, 'crawl state', '''
+        CREATE TABLE IF NOT EXISTS crawl_state (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+    '''),
+    (6, 'hot path indexes', '''
+        -- iter_products_by_status / claim_products: WHERE status = ... ORDER BY id
+        CREATE INDEX IF NOT EXISTS products_status_id_idx ON products (status, id);
+        -- release_expired_leases
+        CREATE INDEX IF NOT EXISTS products_lease_expiry_idx ON products (lease_expires_at)
+            WHERE status = 'IN_PROGRESS';
+        -- get_sellers_to_refresh joins listings by seller; also serves the seller FK cascade
+        CREATE INDEX IF NOT EXISTS products_seller_id_idx ON products (seller_id);
+        -- category FK cascade and per-category listing lookups
+        CREATE INDEX IF NOT EXISTS product_categories_category_id_idx ON product_categories (category_id);
+    '''),
+    (7, 'unique product images and info', '''
+        -- Drop the duplicates earlier re-scrapes left behind, so the ON CONFLICT DO NOTHING in
+        -- the image/info loaders actually has a key to conflict on
+        DELETE FROM product_images AS a USING product_images AS b
+        WHERE a.product_id = b.product_id AND a.image_url = b.image_url AND a.id > b.id;
+        -- Info keeps the newest row per key, i.e. the value from the latest scrape. A key repeated
+        -- on one page keeps a single value by design: info is a key -> value map per product.
+        DELETE FROM product_info AS a USING product_info AS b
+        WHERE a.product_id = b.product_id AND a.info_key = b.info_key AND a.id < b.id;
+        ALTER TABLE product_images
+            ADD CONSTRAINT product_images_product_id_image_url_key UNIQUE (product_id, image_url);
+        ALTER TABLE product_info
+            ADD CONSTRAINT product_info_product_id_info_key_key UNIQUE (product_id, info_key);
+    '''),
+    (8, 'crawl checkpoints', '''
+        -- One row per link-scraping run; finished_at stays NULL until the run completes
+        CREATE TABLE IF NOT EXISTS crawl_runs (
+            run_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP WITH TIME ZONE
+        );
+        -- Pages stored by a run; page -1 marks the whole category as done
+        CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+            run_id TEXT REFERENCES crawl_runs(run_id) ON DELETE CASCADE,
+            category_id INTEGER,
+            page INTEGER,
+            completed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (run_id, category_id, page)
+        );
+    '''),
+    (9, 'product redirects', '''
+        -- Listing URLs that moved, and where they moved to. products.url holds the final URL;
+        -- this map stops link scraping from writing the old one back.
+        CREATE TABLE IF NOT EXISTS product_redirects (
+            from_url TEXT PRIMARY KEY,
+            to_url TEXT NOT NULL,
+            product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        -- Listings earlier runs gave up on at the 301 are scraped again now that redirects are followed
+        UPDATE products SET status = 'NOT_SCRAPED', error_message = NULL
+        WHERE status = 'ERROR' AND error_message = '301';
+    '''),
+]
+
+
+def migrate(conn):
+    # Apply pending migrations. An advisory lock serializes concurrent starters, so only one
+    # process runs them and the others see them as applied.
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(hashtext('schema_migrations'))")
+        try:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT,
+                    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+
+            for version, name, sql in MIGRATIONS:
+                if version in applied:
+                    continue
+                start = time.perf_counter()
+                cursor.execute(sql)
+                cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                conn.commit()
+                print(f"Applied migration {version} ({name}) in {time.perf_counter() - start:.2f}s")
+        finally:
+            conn.rollback()
+            cursor.execute("SELECT pg_advisory_unlock(hashtext('schema_migrations'))")
+            conn.commit()
@@ -1,5 +1,10 @@
 from models.base_model import BaseModel
-from psycopg2.extras import execute_batch
+from models.known_ids import known_seller_ids, known_listing_ids
+from psycopg2.extras import execute_batch, execute_values
+
+# Upsert value for products.url: a listing URL known to redirect keeps the stored final URL
+KEEP_REDIRECTED_URL = """CASE WHEN EXISTS (SELECT 1 FROM product_redirects r WHERE r.from_url = EXCLUDED.url)
+            THEN products.url ELSE EXCLUDED.url END"""
 
 class ProductModel(BaseModel):
     
@@ -9,35 +14,173 @@ class ProductModel(BaseModel):
         except Exception as e:
             print(f"Database Error: {e}")
 
-    def bulk_insert_products(self, products):
+    def bulk_insert_products(self, products, use_copy=False):
+        # Returns the listing_ids that were new, or None if the insert failed
         query = """
         INSERT INTO products (listing_id, name, url)
         VALUES (%s, %s, %s)
         ON CONFLICT (listing_id) DO UPDATE
-        SET name = EXCLUDED.name, url = EXCLUDED.url
-        """
+        SET name = EXCLUDED.name, url = {url}
+        """.format(url=KEEP_REDIRECTED_URL)
+        # Listings already stored are skipped before they reach Postgres
+        known = known_listing_ids()
+        new_ids = set(known.unknown([product['listing_id'] for product in products]))
+        products = [product for product in products if product['listing_id'] in new_ids]
+        if not products:
+            return []
         try:
-            with self.conn.cursor() as cursor:
-                execute_batch(cursor, query, [
-                    (product['listing_id'], product['name'], product['url'])
-                    for product in products
-                ])
-                self.conn.commit()
+            with self.connection() as conn, conn.cursor() as cursor:
+                if use_copy:
+                    self.copy_products(cursor, products)
+                else:
+                    execute_batch(cursor, query, [
+                        (product['listing_id'], product['name'], product['url'])
+                        for product in products
+                    ])
+                conn.commit()
+            known.add(new_ids)
             print(f"Bulk inserted {len(products)} products successfully.")
+            return [product['listing_id'] for product in products]
         except Exception as e:
-            self.conn.rollback()
             print(f"Database Error during bulk insert: {e}")
-            
+            return None
+
+    # COPY loaders: rows are streamed into a session-local staging table (temporary, so never
+    # WAL-logged) and merged into the real table with a single INSERT ... SELECT. Staged rows
+    # are discarded when the surrounding transaction commits.
+    def _create_staging_table(self, cursor, name, columns):
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {name} ({columns}) ON COMMIT DELETE ROWS")
+        cursor.execute(f"TRUNCATE {name}")
+
+    def copy_products(self, cursor, products):
+        self._create_staging_table(cursor, 'products_stage', 'listing_id INTEGER, name TEXT, url TEXT')
+        self.copy_rows(cursor, 'products_stage', ('listing_id', 'name', 'url'),
+                       ((product['listing_id'], product['name'], product['url']) for product in products))
+        cursor.execute("""
+            INSERT INTO products (listing_id, name, url)
+            SELECT DISTINCT ON (listing_id) listing_id, name, url FROM products_stage
+            ORDER BY listing_id
+            ON CONFLICT (listing_id) DO UPDATE
+            SET name = EXCLUDED.name, url = {url}
+            """.format(url=KEEP_REDIRECTED_URL))
+
+    def copy_product_images(self, cursor, rows):
+        # rows: (product_id, image_url)
+        self._create_staging_table(cursor, 'product_images_stage', 'product_id INTEGER, image_url TEXT')
+        self.copy_rows(cursor, 'product_images_stage', ('product_id', 'image_url'), rows)
+        cursor.execute("""
+            INSERT INTO product_images (product_id, image_url)
+            SELECT product_id, image_url FROM product_images_stage
+            ON CONFLICT DO NOTHING
+            """)
+
+    def copy_product_info(self, cursor, rows):
+        # rows: (product_id, info_key, info_value)
+        self._create_staging_table(cursor, 'product_info_stage', 'product_id INTEGER, info_key TEXT, info_value TEXT')
+        self.copy_rows(cursor, 'product_info_stage', ('product_id', 'info_key', 'info_value'), rows)
+        cursor.execute("""
+            INSERT INTO product_info (product_id, info_key, info_value)
+            SELECT product_id, info_key, info_value FROM product_info_stage
+            ON CONFLICT DO NOTHING
+            """)
+
     def get_products_by_status(self, status):
         rows = self.execute_query("SELECT id, name, url FROM products WHERE status = %s", (status,))
         return rows
 
+    def iter_products_by_status(self, status, chunk_size=1000):
+        # Keyset pagination on id: yields bounded chunks and holds no connection between them.
+        # Rows are (id, name, url, content_hash, etag, last_modified, status).
+        last_id = 0
+        while True:
+            rows = self.execute_query(
+                "SELECT id, name, url, content_hash, etag, last_modified, status FROM products "
+                "WHERE status = %s AND id > %s ORDER BY id LIMIT %s",
+                (status, last_id, chunk_size))
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def get_refresh_candidates(self, limit, min_interval_hours=6):
+        # Already-scraped products ordered by how likely a refresh is to find a change:
+        #   hours since last check
+        #   x observed change rate (changes / checks, Laplace-smoothed)
+        #   x up to 2x for listings younger than ~30 days
+        #   x up to 2x for listings the site reports as recently updated
+        #   / 2^errors, so repeatedly failing listings back off (errors reset on the next successful check)
+        # Products checked within min_interval_hours are never picked.
+        return self.execute_query("""
+            SELECT id, name, url, content_hash, etag, last_modified, status
+            FROM products
+            WHERE status IN ('SCRAPED', 'ERROR')
+              AND COALESCE(checked_at, updated_at) < NOW() - %s * INTERVAL '1 hour'
+            ORDER BY
+                EXTRACT(EPOCH FROM NOW() - COALESCE(checked_at, updated_at)) / 3600.0
+                * ((COALESCE(change_count, 0) + 1.0) / (COALESCE(check_count, 0) + 2.0))
+                * (1.0 + 30.0 / (30.0 + EXTRACT(EPOCH FROM NOW() - created_at) / 86400.0))
+                * (1.0 + 7.0 / (7.0 + GREATEST(COALESCE(CURRENT_DATE - last_updated, 365), 0)))
+                / POWER(2, LEAST(COALESCE(error_count, 0), 10))
+                DESC
+            LIMIT %s
+            """, (min_interval_hours, limit))
+
+    def claim_products(self, owner, batch_size, lease_seconds=600):
+        # Atomically lease a batch of NOT_SCRAPED products (or ones whose lease has expired) to owner.
+        # SKIP LOCKED lets several workers claim concurrently without blocking on each other.
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                WITH claimed AS (
+                    SELECT id, status FROM products
+                    WHERE status = 'NOT_SCRAPED'
+                       OR (status = 'IN_PROGRESS' AND lease_expires_at < NOW())
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE products AS p
+                SET status = 'IN_PROGRESS', lease_owner = %s,
+                    lease_expires_at = NOW() + %s * INTERVAL '1 second', updated_at = NOW()
+                FROM claimed
+                WHERE p.id = claimed.id
+                RETURNING p.id, p.name, p.url, p.content_hash, p.etag, p.last_modified, claimed.status
+                """, (batch_size, owner, lease_seconds))
+            rows = cursor.fetchall()
+            conn.commit()
+        return sorted(rows)
+
+    def renew_product_leases(self, owner, product_ids, lease_seconds=600):
+        # Extend the leases owner still holds, for claimed products that haven't been processed yet
+        if not product_ids:
+            return
+        self.execute_query("""
+            UPDATE products SET lease_expires_at = NOW() + %s * INTERVAL '1 second'
+            WHERE id = ANY(%s) AND lease_owner = %s AND status = 'IN_PROGRESS'
+            """, (lease_seconds, list(product_ids), owner), commit=True)
+
+    def release_products(self, owner, product_ids):
+        # Return unfinished leased products to the pool
+        if not product_ids:
+            return
+        self.execute_query("""
+            UPDATE products
+            SET status = 'NOT_SCRAPED', lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW()
+            WHERE id = ANY(%s) AND lease_owner = %s AND status = 'IN_PROGRESS'
+            """, (list(product_ids), owner), commit=True)
+
+    def release_expired_leases(self):
+        self.execute_query("""
+            UPDATE products
+            SET status = 'NOT_SCRAPED', lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW()
+            WHERE status = 'IN_PROGRESS' AND lease_expires_at < NOW()
+            """, commit=True)
+
     def update_product_status(self, product_id, status, error_msg=None):
         if error_msg:
-            self.execute_query("UPDATE products SET status = %s, error_message = %s, updated_at = NOW() WHERE id = %s",
+            self.execute_query("UPDATE products SET status = %s, error_message = %s, lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW() WHERE id = %s",
                 (status, error_msg, product_id), commit=True)
         else:
-            self.execute_query("UPDATE products SET status = %s, updated_at = NOW() WHERE id = %s", (status, product_id), commit=True)
+            self.execute_query("UPDATE products SET status = %s, lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW() WHERE id = %s", (status, product_id), commit=True)
 
     def update_product(self, product_id, product_data):
         try:
@@ -57,12 +200,11 @@ class ProductModel(BaseModel):
             VALUES (%s, %s) ON CONFLICT DO NOTHING;
         """
         try:
-            with self.conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 execute_batch(cursor, query, [(product_id, category_id) for category_id in category_ids])
-            self.conn.commit()
+                conn.commit()
             # print(f"Bulk inserted {len(category_ids)} categories for product {product_id}")
         except Exception as e:
-            self.conn.rollback()
             print(f"Database Error during bulk category insert: {e}")
 
     def insert_product_images(self, product_id, image_urls):
@@ -71,12 +213,11 @@ class ProductModel(BaseModel):
             VALUES (%s, %s) ON CONFLICT DO NOTHING;
         """
         try:
-            with self.conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 execute_batch(cursor, query, [(product_id, image_url) for image_url in image_urls])
-            self.conn.commit()
+                conn.commit()
             # print(f"Bulk inserted {len(image_urls)} images for product {product_id}")
         except Exception as e:
-            self.conn.rollback()
             print(f"Database Error during bulk image insert: {e}")
 
     def insert_product_info_bulk(self, product_id, product_info):
@@ -85,19 +226,158 @@ class ProductModel(BaseModel):
             VALUES (%s, %s, %s) ON CONFLICT DO NOTHING;
         """
         try:
-            with self.conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 execute_batch(cursor, query, [
                     (product_id, key, value)
                     for info_item in product_info
                     for key, value in info_item.items()
                 ])
-            self.conn.commit()
+                conn.commit()
             # print(f"Bulk inserted {len(product_info)} info items for product {product_id}")
         except Exception as e:
-            self.conn.rollback()
             print(f"Database Error during bulk info insert: {e}")
     
     def get_latest_listing_id(self):
         result = self.execute_query("SELECT MAX(listing_id) FROM products")
         return result[0][0] if result and result[0][0] is not None else 0
-    
+
+    def get_unscraped_products(self, listing_ids):
+        # (id, name, url) of the given listings that still need their details scraped
+        if not listing_ids:
+            return []
+        return self.execute_query(
+            "SELECT id, name, url FROM products WHERE listing_id = ANY(%s) AND status = 'NOT_SCRAPED' ORDER BY id",
+            (list(listing_ids),))
+
+    def get_existing_listing_ids(self, listing_ids):
+        # The subset of listing_ids already stored
+        if not listing_ids:
+            return set()
+        rows = self.execute_query("SELECT listing_id FROM products WHERE listing_id = ANY(%s)", (list(listing_ids),))
+        return {row[0] for row in rows}
+
+    def save_product_batch(self, records, use_copy=True):
+        # Persist a batch of scraped products in a single transaction using multi-row statements.
+        # Each record has product_id, status, error_message and, for scraped products, seller,
+        # details, categories and content_hash/etag/last_modified. Records whose status is
+        # UNCHANGED matched their stored fingerprint and only get their check time recorded.
+        # Records of products stored before (previous_status SCRAPED or ERROR, or a previous_hash) are
+        # re-scrapes, so their old images/info/categories are replaced.
+        # Records with redirected_from were fetched from a moved URL and have their url rewritten.
+        scraped = [record for record in records if record['status'] == 'SCRAPED']
+        unchanged = [record for record in records if record['status'] == 'UNCHANGED']
+        failed = [record for record in records if record['status'] not in ('SCRAPED', 'UNCHANGED')]
+
+        sellers = {record['seller']['id']: record['seller'] for record in scraped if record['seller']['id'] is not None}
+        # Only sellers this process hasn't seen stored yet need the insert
+        known_sellers = known_seller_ids()
+        sellers = {id: sellers[id] for id in known_sellers.unknown(list(sellers))}
+        with self.connection() as conn, conn.cursor() as cursor:
+            if sellers:
+                execute_values(cursor, """
+                    INSERT INTO sellers (id, name, contact_number) VALUES %s
+                    ON CONFLICT (id) DO NOTHING
+                    """, [(seller['id'], seller['name'], seller['contact_number'])
+                          for seller in sorted(sellers.values(), key=lambda seller: seller['id'])])
+
+            if scraped:
+                execute_values(cursor, """
+                    UPDATE products AS p
+                    SET price = v.price, product_location = v.product_location, description = v.description,
+                        last_updated = v.last_updated, status = 'SCRAPED', error_message = NULL,
+                        seller_id = v.seller_id, content_hash = v.content_hash, etag = v.etag,
+                        last_modified = v.last_modified, checked_at = NOW(),
+                        check_count = p.check_count + 1,
+                        change_count = p.change_count + CASE WHEN p.content_hash IS NULL THEN 0 ELSE 1 END,
+                        error_count = 0,
+                        lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW()
+                    FROM (VALUES %s) AS v(id, price, product_location, description, last_updated, seller_id,
+                                          content_hash, etag, last_modified)
+                    WHERE p.id = v.id
+                    """, [(record['product_id'], record['details']['price'], record['details']['product_location'],
+                           record['details']['description'], record['details']['last_updated'],
+                           record['details']['seller_id'], record.get('content_hash'), record.get('etag'),
+                           record.get('last_modified'))
+                          for record in scraped],
+                    template="(%s::integer, %s::decimal, %s::text, %s::text, %s::date, %s::integer, %s::text, %s::text, %s::text)")
+
+                replaced = [record['product_id'] for record in scraped
+                            if record.get('previous_status') in ('SCRAPED', 'ERROR') or record.get('previous_hash')]
+                if replaced:
+                    for table in ('product_categories', 'product_images', 'product_info'):
+                        cursor.execute(f"DELETE FROM {table} WHERE product_id = ANY(%s)", (replaced,))
+
+                categories = [(record['product_id'], category_id)
+                              for record in scraped for category_id in set(record['categories'])]
+                if categories:
+                    execute_values(cursor, """
+                        INSERT INTO product_categories (product_id, category_id) VALUES %s
+                        ON CONFLICT DO NOTHING
+                        """, categories)
+
+                images = [(record['product_id'], image_url)
+                          for record in scraped for image_url in record['details']['images']]
+                if images and use_copy:
+                    self.copy_product_images(cursor, images)
+                elif images:
+                    execute_values(cursor, """
+                        INSERT INTO product_images (product_id, image_url) VALUES %s
+                        ON CONFLICT DO NOTHING
+                        """, images)
+
+                info = [(record['product_id'], key, value)
+                        for record in scraped
+                        for info_item in record['details']['product_info']
+                        for key, value in info_item.items()]
+                if info and use_copy:
+                    self.copy_product_info(cursor, info)
+                elif info:
+                    execute_values(cursor, """
+                        INSERT INTO product_info (product_id, info_key, info_value) VALUES %s
+                        ON CONFLICT DO NOTHING
+                        """, info)
+
+            if unchanged:
+                execute_values(cursor, """
+                    UPDATE products AS p
+                    SET status = 'SCRAPED', checked_at = NOW(), check_count = p.check_count + 1, error_count = 0,
+                        etag = COALESCE(v.etag, p.etag), last_modified = COALESCE(v.last_modified, p.last_modified),
+                        lease_owner = NULL, lease_expires_at = NULL
+                    FROM (VALUES %s) AS v(id, etag, last_modified)
+                    WHERE p.id = v.id
+                    """, [(record['product_id'], record.get('etag'), record.get('last_modified'))
+                          for record in unchanged],
+                    template="(%s::integer, %s::text, %s::text)")
+
+            # Listings that redirected: store the final URL so later passes skip the extra hop,
+            # and remember the old one in the redirect map
+            redirected = [record for record in records if record.get('redirected_from')]
+            if redirected:
+                execute_values(cursor, """
+                    UPDATE products AS p SET url = v.url, updated_at = NOW()
+                    FROM (VALUES %s) AS v(id, url)
+                    WHERE p.id = v.id
+                    """, [(record['product_id'], record['url']) for record in redirected],
+                    template="(%s::integer, %s::text)")
+                execute_values(cursor, """
+                    INSERT INTO product_redirects (from_url, to_url, product_id) VALUES %s
+                    ON CONFLICT (from_url) DO UPDATE
+                    SET to_url = EXCLUDED.to_url, product_id = EXCLUDED.product_id, updated_at = NOW()
+                    """, [(record['redirected_from'], record['url'], record['product_id'])
+                          for record in {record['redirected_from']: record for record in redirected}.values()])
+
+            if failed:
+                execute_values(cursor, """
+                    UPDATE products AS p
+                    SET status = v.status, error_message = v.error_message,
+                        check_count = p.check_count + 1, error_count = p.error_count + 1, checked_at = NOW(),
+                        lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW()
+                    FROM (VALUES %s) AS v(id, status, error_message)
+                    WHERE p.id = v.id
+                    """, [(record['product_id'], record['status'],
+                           None if record.get('error_message') is None else str(record['error_message']))
+                          for record in failed],
+                    template="(%s::integer, %s::varchar, %s::text)")
+
+            conn.commit()
+        known_sellers.add(sellers)
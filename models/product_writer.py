@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+from common import metrics
+
+
+class ProductWriter:
+    # Write-behind persistence for scraped products. Workers put() parsed records on a queue of up
+    # to batch_size records, and a single flusher thread takes everything queued once the queue is
+    # full or flush_interval has passed and writes it in one transaction. Producers keep filling
+    # the queue while a batch commits and only block once the next batch is full too, so a crash
+    # loses at most two batches; the affected products are still NOT_SCRAPED and are picked up
+    # again on the next run.
+    def __init__(self, product_model, batch_size=None, flush_interval=None, on_written=None):
+        self.product_model = product_model
+        # Called from the flusher thread with each list of records once it is committed
+        self.on_written = on_written
+        self.batch_size = batch_size or int(os.getenv('WRITER_BATCH_SIZE', 100))
+        self.flush_interval = flush_interval or float(os.getenv('WRITER_FLUSH_INTERVAL', 2.0))
+        self.queue = queue.Queue(maxsize=self.batch_size)
+        # Set when a full batch is waiting, or on close
+        self.ready = threading.Event()
+        self.stopping = False
+        self.written = 0
+        metrics.register_gauge('queue_depth', self.queue.qsize, queue='product_writer')
+        self.thread = threading.Thread(target=metrics.profile_thread(self._run), name='product-writer', daemon=True)
+        self.thread.start()
+
+    def put(self, record):
+        # Blocks while a full batch is already waiting behind the one being written, which
+        # throttles the scrapers feeding it
+        self.queue.put(record)
+        if self.queue.qsize() >= self.batch_size:
+            self.ready.set()
+
+    def _take(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _run(self):
+        while True:
+            self.ready.wait(self.flush_interval)
+            self.ready.clear()
+            stopping = self.stopping
+            self._flush(self._take())
+            if stopping:
+                return
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            with metrics.timer('db_write_seconds', stage='detail'):
+                self.product_model.save_product_batch(batch)
+            metrics.inc('db_rows_written_total', len(batch), stage='detail')
+            self.written += len(batch)
+            self._notify(batch)
+        except Exception as e:
+            # Fall back to one transaction per record so a single bad row doesn't sink the batch
+            print(f"Database Error during batch write of {len(batch)} products: {e}")
+            metrics.inc('db_errors_total', stage='detail')
+            for record in batch:
+                try:
+                    self.product_model.save_product_batch([record])
+                    self.written += 1
+                    self._notify([record])
+                except Exception as e:
+                    print(f"Database Error for product {record['product_id']}: {e}")
+                    self._mark_failed(record, e)
+
+    def _mark_failed(self, record, error):
+        # Record ERROR so the product isn't fetched again on every run; if even that fails the
+        # product stays NOT_SCRAPED and is retried next run
+        try:
+            self.product_model.save_product_batch([{
+                'product_id': record['product_id'], 'status': 'ERROR',
+                'error_message': f"Database Error: {error}"
+            }])
+        except Exception as e:
+            print(f"Database Error marking product {record['product_id']} as ERROR: {e}")
+
+    def _notify(self, records):
+        if self.on_written is not None:
+            try:
+                self.on_written(records)
+            except Exception as e:
+                print(f"Error in write callback: {e}")
+
+    def close(self):
+        # Flush whatever is queued and stop the flusher
+        self.stopping = True
+        self.ready.set()
+        self.thread.join()
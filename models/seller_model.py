@@ -1,41 +1,156 @@
 from models.base_model import BaseModel
+from psycopg2.extras import execute_values
+from models.known_ids import known_seller_ids
 
 class SellerModel(BaseModel):
     def insert_seller(self, seller_details):
+        known = known_seller_ids()
+        if seller_details['id'] in known:
+            return
         try:
             self.execute_query("""
                     INSERT INTO sellers (id, name, contact_number)
                     VALUES (%s, %s, %s)
                     ON CONFLICT (id) DO NOTHING
                     """,(seller_details['id'], seller_details['name'], seller_details['contact_number']), commit=True)
+            known.add([seller_details['id']])
         except Exception as e:
             print(f"Database Error: {e}")
-            self.conn.rollback()
 
     def update_seller(self, seller_details):
+        # Rewrites the profile only when its content_hash changed; otherwise just records the check
         try:
-            self.execute_query("""
-                UPDATE sellers
-                SET image_src = %s, is_premium = %s, description = %s, location = %s, member_since = %s, last_login = %s, updated_at = NOW()
-                WHERE id = %s
-                """, (
-                    seller_details['image_src'], 
-                    seller_details['is_premium'], 
-                    seller_details['description'], 
-                    seller_details['location'], 
-                    seller_details['member_since'], 
-                    seller_details['last_login'],
-                    seller_details['id']
-                ), 
-                commit=True
-            )
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE sellers
+                    SET image_src = %s, is_premium = %s, description = %s, location = %s, member_since = %s, last_login = %s,
+                        content_hash = %s, checked_at = NOW(), lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW()
+                    WHERE id = %s AND content_hash IS DISTINCT FROM %s
+                    """, (
+                        seller_details['image_src'], 
+                        seller_details['is_premium'], 
+                        seller_details['description'], 
+                        seller_details['location'], 
+                        seller_details['member_since'], 
+                        seller_details['last_login'],
+                        seller_details.get('content_hash'),
+                        seller_details['id'],
+                        seller_details.get('content_hash')
+                    )
+                )
+                if cursor.rowcount == 0:
+                    cursor.execute("""
+                        UPDATE sellers SET checked_at = NOW(), lease_owner = NULL, lease_expires_at = NULL
+                        WHERE id = %s
+                        """, (seller_details['id'],))
+                conn.commit()
         except Exception as e:
             print(f"Database Error: {e}")
-            self.conn.rollback()
+
+    def update_sellers(self, sellers):
+        # Batched update_seller: one multi-row UPDATE rewrites the profiles whose content_hash
+        # changed, a second records the check time for every seller in the batch. Raises on error
+        # so the caller can fall back to update_seller() per row.
+        if not sellers:
+            return
+        with self.connection() as conn, conn.cursor() as cursor:
+            execute_values(cursor, """
+                UPDATE sellers AS s
+                SET image_src = v.image_src, is_premium = v.is_premium, description = v.description,
+                    location = v.location, member_since = v.member_since, last_login = v.last_login,
+                    content_hash = v.content_hash, updated_at = NOW()
+                FROM (VALUES %s) AS v(id, image_src, is_premium, description, location, member_since,
+                                      last_login, content_hash)
+                WHERE s.id = v.id AND s.content_hash IS DISTINCT FROM v.content_hash
+                """, [(seller['id'], seller['image_src'], seller['is_premium'], seller['description'],
+                       seller['location'], seller['member_since'], seller['last_login'],
+                       seller.get('content_hash'))
+                      for seller in sellers],
+                template="(%s::integer, %s::text, %s::boolean, %s::text, %s::text, %s::date, %s::date, %s::text)")
+            cursor.execute("""
+                UPDATE sellers SET checked_at = NOW(), lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ANY(%s)
+                """, ([seller['id'] for seller in sellers],))
+            conn.commit()
+
+    def get_sellers_to_refresh(self, max_age_hours=168, seller_ids=None):
+        # Sellers never enriched, or not checked within max_age_hours. Never-enriched sellers come
+        # first, then the ones with the most recently added listings. seller_ids limits the check
+        # to a primary-key lookup, returned in id order without scanning products.
+        if seller_ids is not None:
+            rows = self.execute_query("""
+                SELECT id FROM sellers
+                WHERE id = ANY(%s::integer[])
+                  AND (content_hash IS NULL OR COALESCE(checked_at, updated_at) < NOW() - %s * INTERVAL '1 hour')
+                ORDER BY id
+                """, (list(seller_ids), max_age_hours))
+            return [row[0] for row in rows]
+
+        rows = self.execute_query("""
+            SELECT s.id FROM sellers AS s
+            LEFT JOIN (
+                SELECT seller_id, MAX(created_at) AS latest_listing FROM products
+                WHERE seller_id IS NOT NULL GROUP BY seller_id
+            ) AS p ON p.seller_id = s.id
+            WHERE s.content_hash IS NULL
+               OR COALESCE(s.checked_at, s.updated_at) < NOW() - %s * INTERVAL '1 hour'
+            ORDER BY s.content_hash IS NULL DESC, p.latest_listing DESC NULLS LAST, s.id
+            """, (max_age_hours,))
+        return [row[0] for row in rows]
+
+    def claim_sellers(self, owner, batch_size, since, lease_seconds=600):
+        # Atomically lease a batch of sellers not checked since `since` and not leased by anyone else.
+        # Updating a seller moves checked_at past `since`, which takes it out of the pass.
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                WITH claimed AS (
+                    SELECT id FROM sellers
+                    WHERE COALESCE(checked_at, updated_at) < %s
+                      AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE sellers AS s
+                SET lease_owner = %s, lease_expires_at = NOW() + %s * INTERVAL '1 second'
+                FROM claimed
+                WHERE s.id = claimed.id
+                RETURNING s.id
+                """, (since, batch_size, owner, lease_seconds))
+            rows = cursor.fetchall()
+            conn.commit()
+        return sorted(row[0] for row in rows)
+
+    def renew_seller_leases(self, owner, seller_ids, lease_seconds=600):
+        if not seller_ids:
+            return
+        self.execute_query("""
+            UPDATE sellers SET lease_expires_at = NOW() + %s * INTERVAL '1 second'
+            WHERE id = ANY(%s) AND lease_owner = %s
+            """, (lease_seconds, list(seller_ids), owner), commit=True)
+
+    def release_sellers(self, owner, seller_ids):
+        if not seller_ids:
+            return
+        self.execute_query("""
+            UPDATE sellers SET lease_owner = NULL, lease_expires_at = NULL
+            WHERE id = ANY(%s) AND lease_owner = %s
+            """, (list(seller_ids), owner), commit=True)
 
     def fetch_seller_ids(self):
         try:
             rows = self.execute_query("SELECT id FROM sellers")
             return [id[0] for id in rows]   
         except Exception as e:
-            print(f"Database Error: {e}")
\ No newline at end of file
+            print(f"Database Error: {e}")
+
+    def iter_seller_ids(self, chunk_size=1000):
+        # Keyset pagination on id: yields bounded chunks of seller ids
+        last_id = 0
+        while True:
+            rows = self.execute_query("SELECT id FROM sellers WHERE id > %s ORDER BY id LIMIT %s",
+                                      (last_id, chunk_size))
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+            last_id = rows[-1][0]
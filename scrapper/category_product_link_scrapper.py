@@ -1,105 +1,93 @@
-import requests
-import time
 import os
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup
+from common.runtime import get_runtime
 from models.category_model import CategoryModel
 from models.product_model import ProductModel
-from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from models.checkpoint_model import CheckpointModel, CATEGORY_DONE
+from scrapper.parsers import parse_listing_page
+from scrapper.page_planner import PagePlanner
+from common import metrics
 
 class CategoryProductLinkScraper:
     def __init__(self):
         self.category_model = CategoryModel()
         self.product_model = ProductModel()
-        self.base_url = os.getenv('BASE_URL')
-        self.headers = {"User-Agent": os.getenv('USER_AGENT')}
+        self.base_url = get_runtime().base_url
+        # Pages probed past the last full page when a category's product_count is missing or stale
         self.max_workers = 5
-        self.session = self._create_session()
+        self.fetcher = get_runtime().fetcher
+        # Optional callback with the listing_ids each page added (used by the streaming pipeline)
+        self.on_new_listings = None
+        # Checkpointing: pages stored by the current run, so an interrupted run can resume
+        self.checkpoint_model = CheckpointModel()
+        self.run_id = None
+        self.completed = {}
+        # Unfinished runs older than this are closed and a fresh run starts instead
+        self.resume_max_age_hours = float(os.getenv('CHECKPOINT_MAX_AGE_HOURS', 24))
 
-    def _create_session(self):
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        session.headers.update(self.headers)
-        return session
-
-    def scrape_page(self, id, page_count):
-        current_url = f"{self.base_url}?page=search&s_res=GO&lite=0&cid={id}&hw_num=100&off={page_count}"
-        
-        try: 
-            response = self.session.get(current_url, timeout=30)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'lxml')
-            product_items = soup.find_all(class_='bg-light latest-list-item')
-            
-            if not product_items:
-                return (page_count, None)
-
-            products = [
-                {
-                    'listing_id': int(item.find('div', class_='col m7 s8').h5.a['href'].split('-o')[-1].split('.html')[0]),
-                    'name': item.find('div', class_='col m7 s8').h5.a.text.strip(),
-                    'url': self.base_url + "/" + item.find('div', class_='col m7 s8').h5.a['href']
-                }
-                for item in product_items
-            ]
-            return (page_count, products)
-        except requests.HTTPError as e:
-            if e.response.status_code == 404:
-                print(f"Page not found for Category ID: {id}, Page: {page_count}")
-            else:
-                print(f"HTTP error {e.response.status_code} for {current_url}")
-        except requests.RequestException as e:
-            print(f"Request error: {e} for {current_url}")
-        return (page_count, None)
+    def page_url(self, id, page_count):
+        return f"{self.base_url}?page=search&s_res=GO&lite=0&cid={id}&hw_num=100&off={page_count}"
 
+    def parse_page(self, content):
+        return parse_listing_page(content, self.base_url)
 
     def process_products(self, category):
         id, name = category['id'], category['name']
-        page_count = 0
+        done_pages = self.completed.get(id, set())
+        if CATEGORY_DONE in done_pages:
+            print(f"Skipping Category ID: {id}, Name: {name}; completed by run {self.run_id}")
+            return 0
         total_products = 0
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {}
-            stop_page = 0
-
-            while stop_page == 0:
-                if page_count in futures:
-                    # Wait for the current page to complete
-                    done, _ = wait([futures[page_count]], return_when="FIRST_COMPLETED")
-                    future = done.pop()
-                    page, products = future.result()
-
-                    if products is None:
-                        print(f"No more products found for Category ID: {id}, Name: {name}, Page: {page}. Ending scrape.")
-                        stop_page = page
-                        break
-
-                    self.product_model.bulk_insert_products(products)
-                    total_products += len(products)
-                    print(f"Scraped {len(products)} products for Category ID: {id}, Name: {name}, Page: {page}")
-
-                    # Remove the completed future
-                    del futures[page_count]
+        failed_pages = 0
+        planner = PagePlanner(self.fetcher, lambda page: self.page_url(id, page), self.parse_page,
+                              probe_window=self.max_workers, timeout=30)
 
-                # Launch new workers for the next pages
-                for i in range(page_count, page_count + self.max_workers):
-                    if i not in futures:
-                        futures[i] = executor.submit(self.scrape_page, id, i)
+        # Fetch the pages implied by the stored product_count, consuming them as they complete
+        for page, products, error in planner.crawl(category.get('product_count'), done_pages):
+            if error is not None:
+                print(error)
+                failed_pages += 1
+                continue
+            if products is None:
+                continue
 
-                page_count += 1
+            with metrics.timer('db_write_seconds', stage='links'):
+                new_listings = self.product_model.bulk_insert_products(products, use_copy=True)
+            if new_listings is None:
+                # Not stored, so not checkpointed either: a resumed run fetches the page again
+                metrics.inc('db_errors_total', stage='links')
+                failed_pages += 1
+                continue
+            metrics.inc('items_total', len(products), stage='links', status='SEEN')
+            metrics.inc('items_total', len(new_listings), stage='links', status='NEW')
+            if new_listings and self.on_new_listings is not None:
+                self.on_new_listings(new_listings)
+            total_products += len(products)
+            print(f"Scraped {len(products)} products for Category ID: {id}, Name: {name}, Page: {page}")
+            if self.run_id is not None:
+                self.checkpoint_model.mark_page(self.run_id, id, page)
 
+        # A category with failed pages stays open so a resumed run retries just those pages
+        if self.run_id is not None and not failed_pages:
+            self.checkpoint_model.mark_category(self.run_id, id)
         print(f"Completed scraping for Category ID: {id}, Name: {name}. Total products processed: {total_products}")
+        return failed_pages
 
-    def run(self):
+    def run(self, resume=True):
+        # resume=True picks up the last unfinished run, skipping the pages and categories it stored
         print("Starting the scraping process...")
         try:
+            self.run_id, resumed = (self.checkpoint_model.start_run('category_links', self.resume_max_age_hours)
+                                    if resume else (None, False))
+            if resumed:
+                self.completed = self.checkpoint_model.completed_pages(self.run_id)
+                print(f"Resuming run {self.run_id}: {len(self.completed)} categories have progress")
             parent_categories = self.category_model.get_parent_categories()
-            for category in parent_categories:
-                self.process_products(category)
+            failed_pages = sum(self.process_products(category) for category in parent_categories)
+            # A run with failed pages stays open, so the next run resumes it and retries just those
+            if failed_pages:
+                print(f"{failed_pages} pages failed; run {self.run_id} stays open for the next run to retry")
+            elif self.run_id is not None:
+                self.checkpoint_model.finish_run(self.run_id)
         finally:
             self.close()
         print("All parent categories processed. Scraping complete.")
@@ -107,4 +95,4 @@ class CategoryProductLinkScraper:
     def close(self):
         self.category_model.close()
         self.product_model.close()
-        self.session.close()
\ No newline at end of file
+        self.checkpoint_model.close()
@@ -1,34 +1,80 @@
-import requests
-import os
+from common.runtime import get_runtime
 from models.category_model import CategoryModel
+from scrapper.parsers import parse_categories
+
+
+class CategoryTree:
+    # In-memory parent/child view of the scraped categories, so later stages don't re-query them
+    def __init__(self):
+        self.categories = {}
+        self.children = {}
+
+    def add(self, id, name, parent_id):
+        self.categories[id] = {'id': id, 'name': name, 'parent_id': parent_id}
+        self.children.setdefault(parent_id, []).append(id)
+
+    def roots(self):
+        return [self.categories[id] for id in self.children.get(None, [])]
+
+    def walk(self, parent_id=None, level=0):
+        # Yield (category, level) depth-first, children before the next sibling
+        for id in self.children.get(parent_id, []):
+            yield self.categories[id], level
+            yield from self.walk(id, level + 1)
+
+    def __len__(self):
+        return len(self.categories)
+
 
 class CategoryScraper:
     
     def __init__(self):
         self.category_model = CategoryModel()
-        self.base_url = f"{os.getenv('BASE_URL')}/index.php?page=cat_ajax&id="
-        self.headers = { "User-Agent": os.getenv('USER_AGENT') }
+        self.base_url = f"{get_runtime().base_url}/index.php?page=cat_ajax&id="
+        self.fetcher = get_runtime().fetcher
+        self.tree = CategoryTree()
+
+    def category_url(self, category_id):
+        return self.base_url + str(category_id)
 
-    # Recursively scrape categories using their ID, parent ID and level of depth
-    def scrape_categories(self, category_id, parent_id=None, level=0):
-        url = self.base_url + str(category_id)
-        response = requests.get(url, headers=self.headers)
-        categories = response.json()
+    # Crawl the category tree breadth-first: every category of one level is fetched concurrently
+    # and the level is written with a single multi-row upsert before moving to the next one
+    def scrape_categories(self, root_id=0):
+        level_ids = [root_id]
+        seen = {str(root_id)}
+        level = 0
 
-        if not categories:
-            return
+        while level_ids:
+            rows = []
+            for parent_id, response, error in self.fetcher.fetch_many(level_ids, self.category_url, timeout=30,
+                                                                           stage='categories'):
+                if error is None and response.status_code >= 400:
+                    error = f"HTTP error {response.status_code}"
+                if error is not None:
+                    print(f"Failed to retrieve {self.category_url(parent_id)}: {error}")
+                    continue
+                for category_id, category_name in parse_categories(response.content) or []:
+                    if str(category_id) in seen:
+                        continue
+                    seen.add(str(category_id))
+                    rows.append((int(category_id), category_name, None if parent_id == root_id else int(parent_id)))
 
-        for category in categories:
-            category_id, category_name = list(category.items())[0]
-            print(f"{'  ' * level}{category_name} (ID: {category_id})")
-            self.category_model.insert_category(category_id, category_name, parent_id)
-            self.scrape_categories(category_id, category_id, level + 1) 
+            if rows:
+                self.category_model.upsert_categories(rows)
+                for category_id, category_name, parent_id in rows:
+                    self.tree.add(category_id, category_name, parent_id)
+                print(f"Level {level}: {len(rows)} categories")
+            level_ids = [row[0] for row in rows]
+            level += 1
+
+        return self.tree
 
     def run(self):
         print("Starting to scrape categories...")
         self.scrape_categories(0)
-        print("Scraping complete! Categories saved to the database.")
+        for category, level in self.tree.walk():
+            print(f"{'  ' * level}{category['name']} (ID: {category['id']})")
+        print(f"Scraping complete! {len(self.tree)} categories saved to the database.")
 
     def close(self):
         self.category_model.close()
-
@@ -0,0 +1,187 @@
+import re
+from lxml import etree
+
+# lxml fast path for the page parsers in scrapper/parsers.py. Every selector is compiled once at
+# import time as an XPath expression, each element is looked up a single time, and pages are
+# parsed starting at the region the extractor needs instead of the whole document.
+# Results must match the BeautifulSoup versions exactly; run with PARSER=verify to check.
+
+_html_parser = etree.HTMLParser(remove_comments=True, remove_pis=True)
+
+
+def _has_class(*names):
+    return ' and '.join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in names)
+
+
+def _xpath(expression):
+    return etree.XPath(expression, smart_strings=False)
+
+
+# Search listing pages
+_listing_items = _xpath("//*[@class='bg-light latest-list-item']")
+_listing_link = _xpath("(((.//div[@class='col m7 s8'])[1]//h5)[1]//a)[1]")
+
+# Category landing page
+_view_switch = _xpath(f"//span[{_has_class('view-switch')}]")
+_listings_count = re.compile(r'\d+\s+listings')
+
+# Product detail page
+_disabled = _xpath(f"//font[{_has_class('pagetitle')}][string()='Listing disabled'] | "
+                   f"//p[{_has_class('pagetitle')}][string()='Listing not found']")
+_seller_link = _xpath(f"(//*[{_has_class('iw-user-name')}])[1]")
+_seller_name = _xpath(f"(//*[{_has_class('iw-user-name')}]/b)[1]")
+_contact_number = _xpath(f"(//*[{_has_class('i-detail-des-n')}])[1]")
+_price = _xpath(f"(//*[{_has_class('details-page_product-info')}]//*[{_has_class('price')}])[1]")
+_description = _xpath(f"(//*[{_has_class('iw-description-div')}])[1]")
+_images = _xpath("//*[@id='fullscreen-viewer']//img")
+_last_updated = _xpath("//div[count(node()) = 1 and contains(text(), 'Last Updated : ')]")
+_info_rows = _xpath(f"//*[{_has_class('item-info-table')}]/table/tbody/tr")
+_info_key = _xpath("*[1][self::td]")
+_info_value = _xpath("*[2][self::td]")
+_breadcrumbs = _xpath(f"//div//a[{_has_class('breadcrumb', 'dark')} and contains(@href, 'b')]")
+
+# Seller profile page
+_seller_image = _xpath(f"(//*[{_has_class('bg-light')}]//*[{_has_class('col', 's6', 'l2')}]//img[@src])[1]")
+_premium = _xpath(f"(//*[{_has_class('bg-light')}]//*[{_has_class('col', 's6', 'l4')}]//img[@alt='Premium Seller'])[1]")
+_seller_column = f"//*[{_has_class('bg-light')}]//*[{_has_class('col', 's12', 'l6')}]"
+_seller_description = _xpath(f"({_seller_column}//p)[1]")
+_seller_location = _xpath(f"({_seller_column}//p//b[count(preceding-sibling::*) = 0])[1]")
+_seller_member_since = _xpath(f"({_seller_column}//p//b[count(preceding-sibling::*) = 1])[1]")
+_seller_last_login = _xpath(f"({_seller_column}//p[count(preceding-sibling::p) = 2]//b)[1]")
+
+
+def _parse(content, start_marker=None):
+    # Partial parse: skip everything before the region of interest (head, scripts, navigation)
+    # so lxml only builds the subtree the extractor reads. Falls back to the full document.
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    if start_marker is not None:
+        index = content.find(start_marker)
+        if index != -1:
+            content = content[content.rfind(b'<', 0, index):]
+    return etree.fromstring(content, _html_parser)
+
+
+def _first(xpath, root):
+    found = xpath(root)
+    return found[0] if found else None
+
+
+def _text(element):
+    return ''.join(element.itertext())
+
+
+def parse_listing_page(content, base_url):
+    root = _parse(content, b'bg-light latest-list-item')
+    product_items = _listing_items(root) if root is not None else []
+
+    if not product_items:
+        return None
+
+    products = []
+    for item in product_items:
+        link = _listing_link(item)[0]
+        href = link.get('href')
+        products.append({
+            'listing_id': int(href.split('-o')[-1].split('.html')[0]),
+            'name': _text(link).strip(),
+            'url': base_url + "/" + href
+        })
+    return products
+
+
+def parse_product_count(html):
+    root = _parse(html, b'view-switch')
+    if root is None:
+        return None
+    for element in _view_switch(root):
+        # BeautifulSoup's string= only matches elements with a single text child
+        if len(element) == 0 and element.text and _listings_count.search(element.text):
+            return int(''.join(re.findall(r'\d+', element.text.replace(',', '')))) or 0
+    return None
+
+
+def parse_product_page(content):
+    root = _parse(content, b'<body')
+
+    # Check if the listing is disabled
+    if root is None or _disabled(root):
+        return {'status': 'ERROR', 'error_message': 'Listing disabled or not found'}
+
+    # Seller info extraction
+    seller_link = _first(_seller_link, root)
+    if seller_link is None:
+        raise ValueError("Seller link not found")
+    match = re.search(r'id=(\d+)', seller_link.get('href'))
+    seller_id = int(match.group(1)) if match else None
+    seller_name_element = _first(_seller_name, root)
+    contact_number_element = _first(_contact_number, root)
+
+    seller_details = {
+        'id': seller_id,
+        'name': _text(seller_name_element).strip() if seller_name_element is not None else None,
+        'contact_number': _text(contact_number_element).strip() if contact_number_element is not None else None
+    }
+
+    # Product info extraction
+    product_info = []
+    location = None
+    for row in _info_rows(root):
+        key_element = _first(_info_key, row)
+        value_element = _first(_info_value, row)
+        if key_element is not None and value_element is not None:
+            key = _text(key_element).strip()
+            value = _text(value_element).strip()
+            if key == 'Location':
+                location = value
+            else:
+                product_info.append({key: value})
+
+    price_element = _first(_price, root)
+    description_element = _first(_description, root)
+
+    last_updated = None
+    last_updated_element = _first(_last_updated, root)
+    if last_updated_element is not None:
+        last_updated_match = re.search(r'Last Updated : (\d{1,2}-[A-Za-z]{3}-\d{4})', _text(last_updated_element))
+        last_updated = last_updated_match.group(1) if last_updated_match else None
+
+    product_details = {
+        'price': float(re.sub(r'[^\d.]+', '', _text(price_element).strip())) if price_element is not None else None,
+        'description': _text(description_element).strip() if description_element is not None else None,
+        'images': [img.get('src') for img in _images(root)],
+        'product_info': product_info,
+        'product_location': location,
+        'last_updated': last_updated,
+        'seller_id': seller_id
+    }
+
+    categories = [int(match.group(1)) for element in _breadcrumbs(root)
+                  if (match := re.search(r'b(\d+)', element.get('href')))]
+
+    return {
+        'status': 'SCRAPED',
+        'seller': seller_details,
+        'details': product_details,
+        'categories': categories
+    }
+
+
+def parse_seller_page(content, seller_id):
+    root = _parse(content, b'bg-light')
+
+    image_element = _first(_seller_image, root) if root is not None else None
+    description_element = _first(_seller_description, root) if root is not None else None
+    location_element = _first(_seller_location, root) if root is not None else None
+    member_since_element = _first(_seller_member_since, root) if root is not None else None
+    last_login_element = _first(_seller_last_login, root) if root is not None else None
+
+    return {
+        "id": seller_id,
+        "image_src": "https://" + (image_element.get('src') if image_element is not None else ''),
+        "is_premium": root is not None and _first(_premium, root) is not None,
+        "description": _text(description_element) if description_element is not None else None,
+        "location": _text(location_element) if location_element is not None else None,
+        "member_since": _text(member_since_element) if member_since_element is not None else None,
+        "last_login": (last_login_element.tail or '').strip() if last_login_element is not None else None
+    }
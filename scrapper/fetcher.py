@@ -0,0 +1,202 @@
+import os
+import json
+import asyncio
+import time
+import threading
+import aiohttp
+from scrapper.work import bounded_as_completed
+from scrapper.response_cache import cache_from_env
+from scrapper.rate_control import AdaptiveController
+from common import metrics
+from common.runtime import get_runtime
+
+
+class RequestError(Exception):
+    pass
+
+
+class HTTPError(RequestError):
+    def __init__(self, response):
+        super().__init__(f"HTTP error {response.status_code} for {response.url}")
+        self.response = response
+
+
+class Response:
+    # Minimal requests.Response look-alike so scrapers can keep their parsing code unchanged
+    def __init__(self, url, status_code, headers, content, history=()):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.history = list(history)
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError(self)
+
+
+# Stages whose pages change between runs (search listings): never served from the cache in 'on' mode
+LIVE_STAGES = {'links', 'updater'}
+
+
+def _cacheable(response):
+    # Successful pages, including ones reached through followed redirects, and definite 404s.
+    # Throttling (429), server errors and unfollowed 3xx are never stored.
+    return 200 <= response.status_code < 300 or response.status_code == 404
+
+
+class Fetcher:
+    # Shared asyncio HTTP client. The event loop lives in a background thread so that
+    # synchronous scrapers can submit hundreds of requests and consume plain futures.
+    def __init__(self, headers=None, per_host_limit=None, total_limit=None, retries=3,
+                 backoff_factor=0.1, status_forcelist=(500, 502, 503, 504), timeout=30,
+                 cache=None, cache_mode='off', controller=None):
+        self.headers = headers or {"User-Agent": get_runtime().user_agent}
+        self.per_host_limit = per_host_limit or int(os.getenv('FETCH_PER_HOST_LIMIT', 50))
+        self.total_limit = total_limit or int(os.getenv('FETCH_TOTAL_LIMIT', 200))
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = set(status_forcelist)
+        self.timeout = timeout
+        # Optional ResponseCache. 'on' serves hits and stores misses, 'replay' never touches the network
+        self.cache = cache
+        self.cache_mode = cache_mode if cache is not None else 'off'
+        # Adapts in-flight requests and request rate to how the site is responding (AIMD)
+        self.controller = controller or AdaptiveController(max_concurrency=self.total_limit)
+        metrics.register_gauge('fetch_in_flight', lambda: self.controller.in_flight)
+        metrics.register_gauge('fetch_concurrency_limit', lambda: int(self.controller.concurrency))
+        metrics.register_gauge('fetch_rate_limit', lambda: round(self.controller.rate, 2))
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='fetcher-loop', daemon=True)
+        self.thread.start()
+        self.session = asyncio.run_coroutine_threadsafe(self._create_session(), self.loop).result()
+
+    async def _create_session(self):
+        # Keep-alive connections are pooled by the connector and reused across all requests
+        connector = aiohttp.TCPConnector(
+            limit=self.total_limit,
+            limit_per_host=self.per_host_limit,
+            ttl_dns_cache=300,
+            keepalive_timeout=30
+        )
+        headers = {key: value for key, value in self.headers.items() if value is not None}
+        return aiohttp.ClientSession(connector=connector, headers=headers)
+
+    def _backoff(self, attempt):
+        # Same schedule as urllib3's Retry: no sleep before the first retry, then factor * 2^(n-1)
+        if attempt <= 1:
+            return 0
+        return self.backoff_factor * (2 ** (attempt - 1))
+
+    async def _fetch(self, url, timeout, allow_redirects, headers, stage):
+        if self.cache_mode == 'off':
+            return await self._fetch_network(url, timeout, allow_redirects, headers, stage)
+
+        # Replay serves everything from the cache, conditional requests included (their validators
+        # are ignored). In 'on' mode listing pages are always fetched live, since they change
+        # between runs, but are still stored for replay.
+        loop = asyncio.get_running_loop()
+        replay = self.cache_mode == 'replay'
+        if replay or stage not in LIVE_STAGES:
+            cached = await loop.run_in_executor(None, self.cache.get, url, replay)
+            if cached is not None:
+                metrics.inc('http_cache_hits_total', stage=stage)
+                return Response(*cached)
+        if replay:
+            raise RequestError(f"Not in cache (replay mode): {url}")
+
+        # Missing or stale: go to the network, revalidating with the caller's headers
+        response = await self._fetch_network(url, timeout, allow_redirects, headers, stage)
+        if _cacheable(response):
+            await loop.run_in_executor(None, self.cache.put, url, response)
+        return response
+
+    async def _fetch_network(self, url, timeout, allow_redirects, headers, stage):
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        attempt = 0
+        while True:
+            await self.controller.acquire()
+            start = time.monotonic()
+            status, timed_out = None, False
+            try:
+                async with self.session.get(url, timeout=client_timeout, allow_redirects=allow_redirects,
+                                            headers=headers) as resp:
+                    content = await resp.read()
+                    response = Response(str(resp.url), resp.status, dict(resp.headers), content,
+                                        [str(r.url) for r in resp.history])
+                status = response.status_code
+                if response.status_code not in self.status_forcelist or attempt >= self.retries:
+                    return response
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                metrics.inc('http_errors_total', stage=stage, error=type(e).__name__)
+                if attempt >= self.retries:
+                    raise RequestError(f"{type(e).__name__}: {e}") from e
+            finally:
+                latency = time.monotonic() - start
+                metrics.observe('fetch_seconds', latency, stage=stage)
+                if status is not None:
+                    metrics.inc('http_responses_total', stage=stage, status=status)
+                await self.controller.release(latency, status, timed_out)
+            attempt += 1
+            await asyncio.sleep(self._backoff(attempt))
+
+    def limits(self):
+        # Current adaptive limits and counters, safe to call from any thread
+        return self.controller.snapshot()
+
+    def submit(self, url, timeout=None, allow_redirects=True, headers=None, stage='other'):
+        # Schedule a GET on the shared loop and return a concurrent.futures.Future.
+        # stage labels the request in the fetch metrics.
+        return asyncio.run_coroutine_threadsafe(
+            self._fetch(url, timeout, allow_redirects, headers, stage), self.loop)
+
+    def get(self, url, timeout=None, allow_redirects=True, headers=None, stage='other'):
+        return self.submit(url, timeout, allow_redirects, headers, stage).result()
+
+    def fetch_many(self, items, url_for, timeout=None, max_pending=500, stage='other'):
+        # Fetch items concurrently and yield (item, response, error) as each one completes
+        submit = lambda item: self.submit(url_for(item), timeout, stage=stage)
+        for item, future in bounded_as_completed(submit, items, max_pending):
+            try:
+                yield item, future.result(), None
+            except RequestError as e:
+                yield item, None, e
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    # Process-wide fetcher shared by every scraper
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None or _fetcher.loop.is_closed():
+            cache, cache_mode = cache_from_env()
+            _fetcher = Fetcher(cache=cache, cache_mode=cache_mode)
+        return _fetcher
+
+
+def close_fetcher():
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is not None:
+            _fetcher.close()
+            _fetcher = None
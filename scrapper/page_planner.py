@@ -0,0 +1,88 @@
+import math
+from concurrent.futures import wait, FIRST_COMPLETED
+from scrapper.fetcher import HTTPError, RequestError
+from common import metrics
+
+
+class PagePlanner:
+    # Plans which search result pages to fetch for one listing. When the listing's product_count
+    # is known the exact page set is submitted up front; when it is unknown, or turns out to be
+    # stale (the last planned page is still full), pages are probed probe_window at a time past
+    # the last page that had products. Pages are yielded as they complete, not in page order.
+    def __init__(self, fetcher, url_for, parse, page_size=100, probe_window=5, timeout=30, max_pending=50,
+                 stage='links'):
+        self.fetcher = fetcher
+        self.url_for = url_for
+        self.parse = parse
+        self.page_size = page_size
+        self.probe_window = probe_window
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.stage = stage
+
+    def plan(self, product_count):
+        # Number of pages needed for product_count listings, or None when the count is unknown
+        if not product_count:
+            return None
+        return math.ceil(product_count / self.page_size)
+
+    def _result(self, page, future):
+        # (products, error) for a completed page; products is None for an empty page
+        try:
+            response = future.result()
+            response.raise_for_status()
+            return self.parse(response.content), None
+        except HTTPError as e:
+            return None, f"HTTP error {e.response.status_code} for {self.url_for(page)}"
+        except RequestError as e:
+            return None, f"Request error: {e} for {self.url_for(page)}"
+
+    def crawl(self, product_count=None, skip_pages=()):
+        # Yield (page, products, error) for every fetched page as it completes. products is None
+        # for a page past the end of the listing (or one that failed, with error set).
+        # skip_pages were stored by an earlier, interrupted run; they are treated as full pages.
+        planned = self.plan(product_count)
+        target = planned if planned is not None else self.probe_window
+        end = math.inf  # first page known to be past the end of the listing
+        next_page = 0
+        pending = {}
+
+        while True:
+            while next_page < min(target, end) and len(pending) < self.max_pending:
+                if next_page in skip_pages:
+                    if planned is None or next_page >= planned - 1:
+                        target = max(target, next_page + 1 + self.probe_window)
+                else:
+                    pending[self.fetcher.submit(self.url_for(next_page), timeout=self.timeout,
+                                                       stage=self.stage)] = next_page
+                next_page += 1
+
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = pending.pop(future)
+                if future.cancelled():
+                    continue
+                products, error = self._result(page, future)
+                metrics.inc('pages_total', stage=self.stage,
+                            result='error' if error else 'empty' if not products else 'products')
+
+                if error is None and not products:
+                    end = min(end, page)
+                elif products and len(products) < self.page_size:
+                    # A partial page is the last one
+                    end = min(end, page + 1)
+                elif products and (planned is None or page >= planned - 1):
+                    # Unknown or stale count: keep probing past the furthest full page. A full last
+                    # planned page usually just means the count is an exact multiple, so check one page first.
+                    step = 1 if page == (planned or 0) - 1 else self.probe_window
+                    target = max(target, page + 1 + step)
+
+                yield page, products, error
+
+            # Drop requests for pages we now know are past the end
+            for future, page in list(pending.items()):
+                if page >= end and future.cancel():
+                    del pending[future]
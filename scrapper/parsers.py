@@ -0,0 +1,265 @@
+import os
+import re
+import json
+import hashlib
+from scrapper import fast_parsers
+from common import metrics
+
+# Page parsers shared by the scrapers. They are plain module-level functions that take raw page
+# bytes and return picklable dicts/lists, so they can run inline or in a process pool.
+#
+# PARSER selects the implementation:
+#   lxml   - precompiled XPath fast path (scrapper/fast_parsers.py), BeautifulSoup on failure
+#   bs4    - BeautifulSoup only
+#   verify - run both, report any difference and return the BeautifulSoup result
+PARSER = os.getenv('PARSER', 'lxml')
+
+
+def _soup(content):
+    # bs4 is only needed for fallbacks and PARSER=bs4, so keep it out of the import path
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(content, 'lxml')
+
+
+def _dispatch(name, bs4_version, *args):
+    with metrics.timer('parse_seconds', parser=name):
+        return _parse_with(name, bs4_version, *args)
+
+
+def _parse_with(name, bs4_version, *args):
+    if PARSER == 'bs4':
+        return bs4_version(*args)
+
+    lxml_version = getattr(fast_parsers, name)
+    if PARSER == 'verify':
+        expected = bs4_version(*args)
+        try:
+            actual = lxml_version(*args)
+        except Exception as e:
+            actual = e
+        if actual != expected:
+            print(f"Parser mismatch in {name}: lxml={actual!r} bs4={expected!r}")
+        return expected
+
+    try:
+        return lxml_version(*args)
+    except Exception:
+        metrics.inc('parse_fallbacks_total', parser=name)
+        return bs4_version(*args)
+
+
+# Search listing pages (category links and new product updates)
+def parse_listing_page_bs4(content, base_url):
+    soup = _soup(content)
+    product_items = soup.find_all(class_='bg-light latest-list-item')
+
+    if not product_items:
+        return None
+
+    products = []
+    for item in product_items:
+        link = item.find('div', class_='col m7 s8').h5.a
+        products.append({
+            'listing_id': int(link['href'].split('-o')[-1].split('.html')[0]),
+            'name': link.text.strip(),
+            'url': base_url + "/" + link['href']
+        })
+    return products
+
+
+# cat_ajax JSON: list of {id: name} objects for the children of a category
+def parse_categories(content):
+    return [list(category.items())[0] for category in json.loads(content) or []]
+
+
+# Category landing page: number of listings in the category
+def parse_product_count_bs4(html):
+    soup = _soup(html)
+    view_switch_element = soup.find('span', class_='view-switch', string=re.compile(r'\d+\s+listings'))
+    if view_switch_element:
+        return int(''.join(re.findall(r'\d+', view_switch_element.text.replace(',', '')))) or 0
+    return None
+
+
+# Extract seller ID from the seller URL
+def extract_seller_id(seller_url):
+    # Example URL: https://ibay.com.mv/index.php?page=profile&id=76650
+    match = re.search(r'id=(\d+)', seller_url)
+    return int(match.group(1)) if match else None
+
+# Product price extraction
+def extract_price(soup):
+    product_price_element = soup.select_one('.details-page_product-info .price')
+    return float(re.sub(r'[^\d.]+', '', product_price_element.text.strip())) if product_price_element else None
+
+# Product description extraction
+def extract_description(soup):
+    product_desc_element = soup.select_one('.iw-description-div')
+    return product_desc_element.get_text().strip() if product_desc_element else None
+
+# Product images extraction
+def extract_product_images(soup):
+    image_elements = soup.select('#fullscreen-viewer img')
+    return [img['src'] for img in image_elements] if image_elements else []
+
+# Product last update extraction
+def extract_last_updated(soup):
+    last_updated_element = soup.find('div', string=re.compile('Last Updated : '))
+    if last_updated_element:
+        last_updated_text = last_updated_element.text
+        last_updated_date_match = re.search(r'Last Updated : (\d{1,2}-[A-Za-z]{3}-\d{4})', last_updated_text)
+        return last_updated_date_match.group(1) if last_updated_date_match else None
+    return None
+
+# Product info extraction
+def extract_product_info(soup):
+    product_info = []
+    location = None
+    item_info_table_rows = soup.select('.item-info-table > table > tbody > tr')
+    for row in item_info_table_rows:
+        key_element = row.select_one('td:nth-child(1)')
+        value_element = row.select_one('td:nth-child(2)')
+        if key_element and value_element:
+            key = key_element.text.strip()
+            value = value_element.text.strip()
+            if key == 'Location':
+                location = value
+            else:
+                product_info.append({key: value})
+    return product_info, location
+
+# Product categories extraction
+def extract_categories(soup):
+    breadcrumb_elements = soup.select('div a.breadcrumb.dark[href*="b"]')
+    return [int(match.group(1)) for element in breadcrumb_elements
+            if (match := re.search(r'b(\d+)', element['href']))]
+
+
+# Product detail page. Returns a record ready for ProductModel.save_product_batch (minus product_id).
+def parse_product_page_bs4(content):
+    soup = _soup(content)
+
+    # Check if the listing is disabled
+    if soup.find('font', class_='pagetitle', string='Listing disabled') or soup.find('p', class_='pagetitle', string='Listing not found'):
+        return {'status': 'ERROR', 'error_message': 'Listing disabled or not found'}
+
+    # Seller info extraction
+    seller_url = soup.select_one('.iw-user-name')['href']
+    seller_id = extract_seller_id(seller_url)
+    seller_name_element = soup.select_one('.iw-user-name > b')
+    contact_number_element = soup.select_one('.i-detail-des-n')
+
+    seller_details = {
+        'id': seller_id,
+        'name': seller_name_element.text.strip() if seller_name_element else None,
+        'contact_number': contact_number_element.text.strip() if contact_number_element else None
+    }
+
+    # Extract product details
+    info, location = extract_product_info(soup)
+    product_details = {
+        'price': extract_price(soup),
+        'description': extract_description(soup),
+        'images': extract_product_images(soup),
+        'product_info': info,
+        'product_location': location,
+        'last_updated': extract_last_updated(soup),
+        'seller_id': seller_id
+    }
+
+    return {
+        'status': 'SCRAPED',
+        'seller': seller_details,
+        'details': product_details,
+        'categories': extract_categories(soup)
+    }
+
+
+def parse_listing_page(content, base_url):
+    return _dispatch('parse_listing_page', parse_listing_page_bs4, content, base_url)
+
+
+def parse_product_count(html):
+    return _dispatch('parse_product_count', parse_product_count_bs4, html)
+
+
+def parse_product_page(content):
+    return _dispatch('parse_product_page', parse_product_page_bs4, content)
+
+
+def parse_seller_page(content, seller_id):
+    return _dispatch('parse_seller_page', parse_seller_page_bs4, content, seller_id)
+
+
+# Normalized fingerprint of parsed page data: whitespace is collapsed and keys are sorted, so
+# markup or layout changes that don't affect the extracted values keep the same hash
+def fingerprint(data):
+    def normalize(value):
+        if isinstance(value, str):
+            return ' '.join(value.split())
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        return value
+    encoded = json.dumps(normalize(data), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def _header(headers, name):
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+# Product detail response, including the HTTP status checks done before parsing.
+# A 304 to a conditional request comes back as UNCHANGED. Moved listings are followed by the
+# fetcher; the record then carries the final url and the one originally requested.
+def parse_product_response(response):
+    if response.status_code == 304:
+        record = {'status': 'UNCHANGED', 'etag': _header(response.headers, 'etag'),
+                  'last_modified': _header(response.headers, 'last-modified')}
+    elif response.status_code == 404 or 300 <= response.status_code < 400:
+        # A 3xx here is a redirect the fetcher could not follow (no Location header)
+        record = {'status': 'ERROR', 'error_message': response.status_code}
+    else:
+        record = parse_product_page(response.content)
+        if record['status'] == 'SCRAPED':
+            record['content_hash'] = fingerprint([record['seller'], record['details'], sorted(record['categories'])])
+            record['etag'] = _header(response.headers, 'etag')
+            record['last_modified'] = _header(response.headers, 'last-modified')
+    if response.history and response.url != response.history[0]:
+        record['url'] = response.url
+        record['redirected_from'] = response.history[0]
+    return record
+
+
+# Seller profile page
+def parse_seller_page_bs4(content, seller_id):
+    soup = _soup(content)
+
+    image_element = soup.select_one('.bg-light .col.s6.l2 img[src]')
+    description_element = soup.select_one('.bg-light .col.s12.l6 p')
+    location_element = soup.select_one('.bg-light .col.s12.l6 p b:nth-child(1)')
+    member_since_element = soup.select_one('.bg-light .col.s12.l6 p b:nth-child(2)')
+    last_login_element = soup.select_one('.bg-light .col.s12.l6 p:nth-of-type(3) b')
+
+    return {
+        "id": seller_id,
+        "image_src": "https://" + (image_element['src'] if image_element else ''),
+        "is_premium": bool(soup.select_one('.bg-light .col.s6.l4 img[alt="Premium Seller"]')),
+        "description": description_element.get_text() if description_element else None,
+        "location": location_element.get_text() if location_element else None,
+        "member_since": member_since_element.get_text() if member_since_element else None,
+        "last_login": last_login_element.next_sibling.strip() if last_login_element else None
+    }
+
+
+# Seller profile response, including the HTTP status check done before parsing
+def parse_seller_response(response, seller_id):
+    if response.status_code != 200:
+        return None
+    seller_info = parse_seller_page(response.content, seller_id)
+    seller_info['content_hash'] = fingerprint(seller_info)
+    return seller_info
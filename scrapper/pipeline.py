@@ -0,0 +1,149 @@
+import os
+import queue
+import threading
+from models.category_model import CategoryModel
+from models.product_model import ProductModel
+from models.seller_model import SellerModel
+from scrapper.category_scrapper import CategoryScraper
+from scrapper.category_product_link_scrapper import CategoryProductLinkScraper
+from scrapper.product_detail_scraper import ProductDetailScraper
+from scrapper.seller_scraper import SellerScraper
+from scrapper.work import END
+from common import metrics
+
+
+class Pipeline:
+    # Streams the stages into each other instead of running them one after another:
+    #   categories -> link scraping -> detail scraping -> seller enrichment
+    # Each new listing goes to the detail stage as soon as its page is stored, and each seller
+    # to the seller stage once the product that references it is committed. Stages are joined
+    # by bounded queues, so a slow stage throttles the ones feeding it instead of buffering.
+    def __init__(self, link_workers=None, detail_workers=None, seller_workers=None, queue_size=None,
+                 refresh_categories=False):
+        self.link_workers = link_workers or int(os.getenv('PIPELINE_LINK_WORKERS', 4))
+        self.detail_workers = detail_workers or int(os.getenv('PIPELINE_DETAIL_WORKERS', 200))
+        self.seller_workers = seller_workers or int(os.getenv('PIPELINE_SELLER_WORKERS', 50))
+        queue_size = queue_size or int(os.getenv('PIPELINE_QUEUE_SIZE', 1000))
+        self.refresh_categories = refresh_categories
+
+        self.category_model = CategoryModel()
+        self.product_model = ProductModel()
+        self.seller_model = SellerModel()
+
+        self.categories = queue.Queue()
+        self.products = queue.Queue(maxsize=queue_size)
+        self.sellers = queue.Queue(maxsize=queue_size)
+        self.seen_sellers = set()
+        self.seller_max_age_hours = float(os.getenv('SELLER_MAX_AGE_HOURS', 168))
+
+    def queue_depths(self):
+        return {'categories': self.categories.qsize(), 'products': self.products.qsize(),
+                'sellers': self.sellers.qsize()}
+
+    def on_new_listings(self, listing_ids):
+        # Link stage: newly stored listings go straight to detail scraping
+        for product in self.product_model.get_unscraped_products(listing_ids):
+            self.products.put(product)
+
+    def on_products_written(self, records):
+        # Detail stage: sellers referenced by committed products go to enrichment once per run,
+        # unless their profile was refreshed recently
+        seller_ids = {record['seller']['id'] for record in records
+                      if record['status'] == 'SCRAPED' and record['seller']['id'] is not None}
+        seller_ids -= self.seen_sellers
+        if not seller_ids:
+            return
+        self.seen_sellers |= seller_ids
+        for seller_id in self.seller_model.get_sellers_to_refresh(self.seller_max_age_hours, sorted(seller_ids)):
+            self.sellers.put(seller_id)
+
+    def run_categories(self):
+        try:
+            categories = None
+            if self.refresh_categories:
+                # Use the freshly crawled tree instead of reading the categories back
+                scraper = CategoryScraper()
+                roots = scraper.scrape_categories(0).roots()
+                scraper.close()
+                if roots:
+                    counts = self.category_model.get_product_counts([root['id'] for root in roots])
+                    categories = [{'id': root['id'], 'name': root['name'], 'product_count': counts.get(root['id'])}
+                                  for root in roots]
+            if categories is None:
+                categories = self.category_model.get_parent_categories()
+            for category in categories:
+                self.categories.put(category)
+        finally:
+            for _ in range(self.link_workers):
+                self.categories.put(END)
+
+    def run_links(self):
+        scraper = CategoryProductLinkScraper()
+        scraper.on_new_listings = self.on_new_listings
+        try:
+            while True:
+                category = self.categories.get()
+                if category is END:
+                    return
+                try:
+                    scraper.process_products(category)
+                except Exception as e:
+                    print(f"Error scraping links for category {category['id']}: {e}")
+        finally:
+            scraper.close()
+
+    def _drain(self, source):
+        # A stage that died still has to consume its queue, or the stage feeding it blocks forever
+        while source.get() is not END:
+            pass
+
+    def run_details(self):
+        scraper = ProductDetailScraper()
+        scraper.max_pending = self.detail_workers
+        scraper.on_written = self.on_products_written
+        try:
+            scraper.scrape(self.products)
+        except BaseException as e:
+            print(f"Detail stage failed: {e!r}")
+            self._drain(self.products)
+        finally:
+            scraper.close()
+            self.sellers.put(END)
+
+    def run_sellers(self):
+        scraper = SellerScraper()
+        scraper.max_pending = self.seller_workers
+        try:
+            scraper.scrape(self.sellers)
+        except BaseException as e:
+            print(f"Seller stage failed: {e!r}")
+            self._drain(self.sellers)
+        finally:
+            scraper.close()
+
+    def run(self):
+        print("Starting the pipeline...")
+        for name in ('categories', 'products', 'sellers'):
+            metrics.register_gauge('queue_depth', getattr(self, name).qsize, queue=f'pipeline_{name}')
+        link_threads = [threading.Thread(target=metrics.profile_thread(self.run_links), name=f'pipeline-links-{i}')
+                        for i in range(self.link_workers)]
+        detail_thread = threading.Thread(target=metrics.profile_thread(self.run_details), name='pipeline-details')
+        seller_thread = threading.Thread(target=metrics.profile_thread(self.run_sellers), name='pipeline-sellers')
+        for thread in [*link_threads, detail_thread, seller_thread]:
+            thread.start()
+
+        try:
+            self.run_categories()
+            for thread in link_threads:
+                thread.join()
+        finally:
+            # Links are done (or failed): let the detail stage drain, which in turn ends the seller stage
+            self.products.put(END)
+            detail_thread.join()
+            seller_thread.join()
+        print("Pipeline complete.")
+
+    def close(self):
+        self.category_model.close()
+        self.product_model.close()
+        self.seller_model.close()
@@ -1,47 +1,22 @@
-import requests
-import os
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import re
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from common.runtime import get_runtime
 from models.category_model import CategoryModel
+from scrapper.parsers import parse_product_count
 
 class ProductCountScraper:
     def __init__(self):
         self.category_model = CategoryModel()
-        self.base_url = os.getenv('BASE_URL')
-        self.headers = { "User-Agent": os.getenv('USER_AGENT') }
-        self.session = self.create_session()
+        self.base_url = get_runtime().base_url
+        self.fetcher = get_runtime().fetcher
 
-    def create_session(self):
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        session.headers.update(self.headers)
-        return session
+    def category_url(self, category):
+        return f"{self.base_url}/processor-b{category['id']}_0.html"
 
-    def fetch(self, url):
-        try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return response.text
-        except requests.RequestException as e:
-            print(f"Failed to retrieve {url}: {e}")
-            return None
-
-    def process_page(self, category):
+    def process_page(self, category, html):
         # Process a category page to extract product count
         id, name = category['id'], category['name']
-        url = f"{self.base_url}/processor-b{id}_0.html"
-        html = self.fetch(url)
         if html:
-            soup = BeautifulSoup(html, 'lxml')
-            view_switch_element = soup.find('span', class_='view-switch', string=re.compile(r'\d+\s+listings'))
-            if view_switch_element:
-                numbers = int(''.join(re.findall(r'\d+', view_switch_element.text.replace(',', '')))) or 0
+            numbers = parse_product_count(html)
+            if numbers is not None:
                 self.category_model.update_product_count(int(id), numbers)
                 print(f"Processed ID {id} - {name}: Products found: {numbers}")
             else:
@@ -49,9 +24,14 @@ class ProductCountScraper:
 
     def run(self):
         categories = self.category_model.get_all_categories()
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            list(executor.map(self.process_page, categories))
+        for category, response, error in self.fetcher.fetch_many(categories, self.category_url, timeout=10,
+                                                                      stage='counts'):
+            if error is None and response.status_code >= 400:
+                error = f"HTTP error {response.status_code}"
+            if error is not None:
+                print(f"Failed to retrieve {self.category_url(category)}: {error}")
+                continue
+            self.process_page(category, response.text)
 
     def close(self):
         self.category_model.close()
-        self.session.close()
\ No newline at end of file
@@ -1,157 +1,198 @@
-import re
 import os
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup
+import time
+import heapq
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from models.category_model import CategoryModel 
 from models.product_model import ProductModel 
 from models.seller_model import SellerModel 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import sys
+from models.product_writer import ProductWriter
+from scrapper.parsers import parse_product_response
+from common import metrics
+from common.runtime import get_runtime
+from scrapper.work import as_completed_from, bounded_as_completed, worker_id, pipe
 
 class ProductDetailScraper:
-    def __init__(self):
+    def __init__(self, parse_workers=None):
         self.category_model = CategoryModel()
         self.product_model = ProductModel()
         self.seller_model = SellerModel()
-        self.headers = {"User-Agent": os.getenv('USER_AGENT')}
-        self.session = self.create_session()
-
-    def create_session(self):
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        session.headers.update(self.headers)
-        return session
-
-    # Extract seller ID from the seller URL
-    def extract_seller_id(self, seller_url):
-        # Example URL: https://ibay.com.mv/index.php?page=profile&id=76650
-        match = re.search(r'id=(\d+)', seller_url)
-        return int(match.group(1)) if match else None
-    
-    # Product price extraction
-    def extract_price(self, soup):
-        product_price_element  = soup.select_one('.details-page_product-info .price')
-        return float(re.sub(r'[^\d.]+', '', product_price_element.text.strip())) if product_price_element else None
-    
-    # Product description extraction
-    def extract_description(self, soup):
-        product_desc_element = soup.select_one('.iw-description-div')
-        return product_desc_element.get_text().strip() if product_desc_element else None
-    
-    # Product images extraction
-    def extract_product_images(self, soup):
-        image_elements = soup.select('#fullscreen-viewer img')
-        return [img['src'] for img in image_elements] if image_elements else []
-    
-    # Product last update extraction
-    def extract_last_updated(self, soup):
-        last_updated_element = soup.find('div', string=re.compile('Last Updated : '))
-        if last_updated_element:
-            last_updated_text = last_updated_element.text
-            last_updated_date_match = re.search(r'Last Updated : (\d{1,2}-[A-Za-z]{3}-\d{4})', last_updated_text)
-            return last_updated_date_match.group(1) if last_updated_date_match else None
-        return None
-    
-    # Product info extraction
-    def extract_product_info(self, soup):
-        product_info = []
-        location = None
-        item_info_table_rows = soup.select('.item-info-table > table > tbody > tr')
-        for row in item_info_table_rows:
-            key_element = row.select_one('td:nth-child(1)')
-            value_element = row.select_one('td:nth-child(2)')
-            if key_element and value_element:
-                key = key_element.text.strip()
-                value = value_element.text.strip()
-                if key == 'Location':
-                    location = value
-                else:
-                    product_info.append({key: value})
-        return product_info, location
-    
-    # Product categories extraction
-    def extract_categories(self, soup):
-        breadcrumb_elements = soup.select('div a.breadcrumb.dark[href*="b"]')
-        return [int(match.group(1)) for element in breadcrumb_elements 
-                if (match := re.search(r'b(\d+)', element['href']))]
-    
-    def get_product_details(self, product_id, product_name, url):
+        self.fetcher = get_runtime().fetcher
+        self.writer = None
+        self.chunk_size = 1000
+        self.max_pending = 500
+        # Parse pages in a process pool instead of the calling thread (0 = parse inline)
+        self.parse_workers = int(os.getenv('PARSE_WORKERS', 0)) if parse_workers is None else parse_workers
+        self.parse_pool = None
+        # Lease settings for running several detail scrapers against one database
+        self.worker_id = worker_id()
+        self.claim_size = 200
+        self.lease_seconds = 600
+        self.claimed = set()
+        self.renewed_at = None
+        # Optional callback for records once they are committed (used by the streaming pipeline)
+        self.on_written = None
+        # Failed products are retried with exponential backoff before being recorded as ERROR
+        self.max_retries = int(os.getenv('DETAIL_MAX_RETRIES', 3))
+        self.retry_backoff = float(os.getenv('DETAIL_RETRY_BACKOFF', 10))
+        self.retries = []
+        self.retry_sequence = itertools.count()
+
+    def save(self, record):
+        # Hand the record to the write-behind writer when one is running, otherwise write it now
+        if self.writer is not None:
+            self.writer.put(record)
+        else:
+            self.product_model.save_product_batch([record])
+
+    def conditional_headers(self, product):
+        # Revalidate with the ETag/Last-Modified seen on the previous scrape, when the site sent them
+        headers = {}
+        if len(product) > 4 and product[4]:
+            headers['If-None-Match'] = product[4]
+        if len(product) > 5 and product[5]:
+            headers['If-Modified-Since'] = product[5]
+        return headers or None
+
+    def submit(self, url, headers=None):
+        # Fetch the page and, in pipeline mode, parse it in the process pool as soon as it arrives
+        future = self.fetcher.submit(url, timeout=10, headers=headers, stage='detail')
+        if self.parse_pool is not None:
+            future = pipe(future, self.parse_pool, parse_product_response)
+        return future
+
+    def schedule_retry(self, product, attempt):
+        # product: (id, name, url, content_hash, status); retried unconditionally after retry_backoff * 2^(attempt-1) seconds
+        ready_at = time.monotonic() + self.retry_backoff * 2 ** (attempt - 1)
+        heapq.heappush(self.retries, (ready_at, next(self.retry_sequence), attempt, product))
+
+    def drain_retries(self):
+        # Work through the retry queue, waiting for each batch to become due
+        while self.retries:
+            self.renew_leases()
+            time.sleep(max(0, self.retries[0][0] - time.monotonic()))
+            due = []
+            while self.retries and self.retries[0][0] <= time.monotonic():
+                _, _, attempt, product = heapq.heappop(self.retries)
+                due.append((attempt, product))
+                self.claimed.add(product[0])
+            print(f"Retrying {len(due)} products")
+            submit = lambda item: self.submit(item[1][2])
+            for (attempt, product), future in bounded_as_completed(submit, due, self.max_pending):
+                self.get_product_details(product[0], product[1], product[2], future, product[3], attempt, product[4])
+                self.claimed.discard(product[0])
+                self.renew_leases()
+
+    def get_product_details(self, product_id, product_name, url, future=None, previous_hash=None, attempt=0,
+                            previous_status=None):
         try:
-            response = self.session.get(url, timeout=10)
-            if response.status_code in [301, 404]:
-                self.product_model.update_product_status(product_id, 'ERROR', response.status_code)
+            if future is None:
+                future = self.submit(url)
+            result = future.result()
+            # Pipeline mode resolves to a parsed record, inline mode to the raw response
+            record = result if self.parse_pool is not None else parse_product_response(result)
+            record['product_id'] = product_id
+            record['previous_hash'] = previous_hash
+            record['previous_status'] = previous_status
+            if record.get('redirected_from'):
+                metrics.inc('redirects_total', stage='detail')
+                print(f"Moved: {product_name} -> {record['url']}")
+
+            # Same fingerprint as last time: skip the write path, only record the check
+            if record['status'] == 'SCRAPED' and previous_hash and record['content_hash'] == previous_hash:
+                record['status'] = 'UNCHANGED'
+            metrics.inc('items_total', stage='detail', status=record['status'])
+            if record['status'] == 'UNCHANGED':
+                self.save(record)
+                print(f"Unchanged: {product_name}")
                 return None
 
-            soup = BeautifulSoup(response.content, 'lxml')
+            # Seller, product, categories, images and info are written together in one batch
+            self.save(record)
 
-            # Check if the listing is disabled
-            if soup.find('font', class_='pagetitle', text='Listing disabled') or soup.find('p', class_='pagetitle', text='Listing not found'):
-                self.product_model.update_product_status(product_id, 'ERROR', 'Listing disabled or not found')
-                print(f"Listing for {product_id} is not available. Skipping...")
+            if record['status'] != 'SCRAPED':
+                if record['error_message'] == 'Listing disabled or not found':
+                    print(f"Listing for {product_id} is not available. Skipping...")
                 return None
 
-            # Seller info extraction
-            seller_url = soup.select_one('.iw-user-name')['href']
-            seller_id = self.extract_seller_id(seller_url)
-            seller_name = soup.select_one('.iw-user-name > b').text.strip() if soup.select_one('.iw-user-name > b') else None
-            contact_number = soup.select_one('.i-detail-des-n').text.strip() if soup.select_one('.i-detail-des-n') else None
-
-            seller_details = {
-                'id': seller_id,
-                'name': seller_name,
-                'contact_number': contact_number
-            }
-
-            self.seller_model.insert_seller(seller_details)
-
-            # Extract product details
-            info, location = self.extract_product_info(soup)
-            product_details = {
-                'price': self.extract_price(soup),
-                'description': self.extract_description(soup),
-                'images': self.extract_product_images(soup),
-                'product_info': info,
-                'product_location': location,
-                'last_updated': self.extract_last_updated(soup),
-                'seller_id': seller_id
-            }
-
-            # Update product table with details
-            self.product_model.update_product(product_id, product_details)
-
-            # Insert product categories
-            product_categories = self.extract_categories(soup)
-            self.product_model.insert_product_categories(product_id, product_categories)
-
-            # Insert product images
-            self.product_model.insert_product_images(product_id, product_details['images'])
-
-            # Insert product information key-value pairs
-            self.product_model.insert_product_info_bulk(product_id, product_details['product_info'])
-
-            # If all goes well, update the product status to 'SCRAPED'
-            self.product_model.update_product_status(product_id, 'SCRAPED')
-
             print(f"Scraped: {product_name}")
-            return product_details
+            return record['details']
 
         except Exception as e:
-            print(f"Error occurred while processing {url}: {e}")
-            self.product_model.update_product_status(product_id, 'ERROR', str(e))
-            sys.exit(1)
-
-    def run(self):
-        products = self.product_model.get_products_by_status('NOT_SCRAPED')
-
-        with ThreadPoolExecutor(max_workers=12) as executor:
-            futures = [executor.submit(self.get_product_details, product[0], product[1], product[2]) for product in products]
-            for future in futures:
-                future.result()
+            # One bad product no longer stops the run: retry it later, and only record ERROR once retries run out
+            metrics.inc('item_errors_total', stage='detail', error=type(e).__name__)
+            if attempt < self.max_retries:
+                print(f"Error occurred while processing {url}: {e}. Retry {attempt + 1} of {self.max_retries} scheduled")
+                self.schedule_retry((product_id, product_name, url, previous_hash, previous_status), attempt + 1)
+            else:
+                print(f"Error occurred while processing {url}: {e}. Giving up")
+                self.save({'product_id': product_id, 'status': 'ERROR', 'error_message': str(e)})
+            return None
+
+    def renew_leases(self):
+        # Claimed products can wait locally longer than the lease (claim-ahead, a throttled fetch
+        # rate, retry backoff). Extend the leases of everything still pending well before they
+        # expire, so another worker never re-claims a product this one still holds.
+        if self.renewed_at is None or time.monotonic() - self.renewed_at < self.lease_seconds / 3:
+            return
+        pending = self.claimed | {product[0] for _, _, _, product in self.retries}
+        self.product_model.renew_product_leases(self.worker_id, pending, self.lease_seconds)
+        self.renewed_at = time.monotonic()
+
+    def iter_products(self, status='NOT_SCRAPED'):
+        for chunk in self.product_model.iter_products_by_status(status, self.chunk_size):
+            yield from chunk
+
+    def iter_claimed_products(self):
+        # Keep leasing batches until no unclaimed work is left
+        while True:
+            self.renew_leases()
+            products = self.product_model.claim_products(self.worker_id, self.claim_size, self.lease_seconds)
+            if not products:
+                return
+            if self.renewed_at is None:
+                self.renewed_at = time.monotonic()
+            self.claimed.update(product[0] for product in products)
+            yield from products
+
+    def run(self, batch_size=None, flush_interval=None, leased=False, status='NOT_SCRAPED'):
+        # leased=True claims work with SELECT ... FOR UPDATE SKIP LOCKED so several processes can run at once.
+        # status='SCRAPED' re-scrapes stored products, skipping the ones whose content hasn't changed.
+        # Products left IN_PROGRESS by a worker that died go back to NOT_SCRAPED first.
+        self.product_model.release_expired_leases()
+        products = self.iter_claimed_products() if leased else self.iter_products(status)
+        self.scrape(products, batch_size, flush_interval)
+
+    def scrape(self, products, batch_size=None, flush_interval=None):
+        # products: rows of (id, name, url[, content_hash, etag, last_modified, status]), or a queue of them
+        # fed by another stage until it receives work.END
+        self.writer = ProductWriter(self.product_model, batch_size, flush_interval, self.on_written)
+        if self.parse_workers:
+            self.parse_pool = ProcessPoolExecutor(self.parse_workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            # Requests run concurrently on the shared fetcher; pages are parsed as they arrive.
+            # Products are read in chunks and submitted with backpressure.
+            submit = lambda product: self.submit(product[2], self.conditional_headers(product))
+            for product, future in as_completed_from(submit, products, self.max_pending):
+                previous_hash = product[3] if len(product) > 3 else None
+                previous_status = product[6] if len(product) > 6 else None
+                self.get_product_details(product[0], product[1], product[2], future, previous_hash,
+                                         previous_status=previous_status)
+                self.claimed.discard(product[0])
+                self.renew_leases()
+            self.drain_retries()
+        finally:
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown(cancel_futures=True)
+                self.parse_pool = None
+            self.writer.close()
+            self.writer = None
+            # Anything still claimed was never finished; hand it back instead of waiting for the lease to expire
+            self.product_model.release_products(self.worker_id, self.claimed)
+            self.claimed.clear()
+            self.retries.clear()
+            self.renewed_at = None
 
     def close(self):
         self.category_model.close()
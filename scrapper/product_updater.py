@@ -1,27 +1,20 @@
-import requests
-from bs4 import BeautifulSoup
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from models.category_model import CategoryModel
 from models.product_model import ProductModel
-import os
+from models.crawl_state_model import CrawlStateModel
+from scrapper.fetcher import HTTPError, RequestError
+from scrapper.parsers import parse_listing_page
+from scrapper.page_planner import PagePlanner
+from common.runtime import get_runtime
 
 class ProductUpdater:
     def __init__(self):
         self.product_model = ProductModel()
-        self.headers = {"User-Agent": os.getenv('USER_AGENT')}
-        self.base_url = os.getenv('BASE_URL', 'https://ibay.com.mv')
+        self.category_model = CategoryModel()
+        self.state_model = CrawlStateModel()
+        self.base_url = get_runtime().base_url
+        # Pages probed ahead of the last full page when the page count can't be planned
         self.max_workers = 15
-        self.session = self._create_session()
-
-    def _create_session(self):
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        session.headers.update(self.headers)
-        return session
+        self.fetcher = get_runtime().fetcher
 
     def _build_search_url(self, category_id, days, page):
         url = f"{self.base_url}/index.php?page=search&s_res=GO&lite=0"
@@ -32,72 +25,112 @@ class ProductUpdater:
         url += f"&hw_num=100&off={page}"
         return url
 
-    def scrape_page(self, url, page):
-        try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'lxml')
-            product_items = soup.find_all(class_='bg-light latest-list-item')
-            
-            if not product_items:
-                return (page, None)
-
-            products = [
-                {
-                    'listing_id': int(item.find('div', class_='col m7 s8').h5.a['href'].split('-o')[-1].split('.html')[0]),
-                    'name': item.find('div', class_='col m7 s8').h5.a.text.strip(),
-                    'url': self.base_url + "/" + item.find('div', class_='col m7 s8').h5.a['href']
-                }
-                for item in product_items
-            ]
-            return (page, products)
-        except requests.HTTPError as e:
-            print(f"HTTP error {e.response.status_code} for {url}")
-        except requests.RequestException as e:
-            print(f"Request error: {e} for {url}")
-        return (page, None)
+    def parse_page(self, content):
+        return parse_listing_page(content, self.base_url)
 
     def process_products(self, category_id=None, days=None):
-        page_count = 0
         total_products = 0
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {}
-            stop_page = 0
+        planner = PagePlanner(self.fetcher, lambda page: self._build_search_url(category_id, days, page),
+                              self.parse_page, probe_window=self.max_workers, timeout=10, stage='updater')
 
-            while stop_page == 0:
-                if page_count in futures:
-                    # Wait for the current page to complete
-                    done, _ = wait([futures[page_count]], return_when="FIRST_COMPLETED")
-                    future = done.pop()
-                    page, products = future.result()
+        # The stored product_count only describes a whole category; a days window has to be probed
+        product_count = self.category_model.get_product_count(category_id) if category_id and not days else None
 
-                    if products is None:
-                        print(f"No products found for Category ID: {category_id}, Days: {days}, Page: {page}")
-                        stop_page = page
-                        break
+        for page, products, error in planner.crawl(product_count):
+            if error is not None:
+                print(error)
+                continue
+            if products is None:
+                continue
 
-                    self.product_model.bulk_insert_products(products)
-                    total_products += len(products)
-                    print(f"Scraped {len(products)} products for Category ID: {category_id}, Days: {days}, Page: {page}")
+            self.product_model.bulk_insert_products(products, use_copy=True)
+            total_products += len(products)
+            print(f"Scraped {len(products)} products for Category ID: {category_id}, Days: {days}, Page: {page}")
+
+        print(f"Completed updating product links. Total products processed: {total_products}")
 
-                    # Remove the completed future
-                    del futures[page_count]
+    def high_water_key(self, category_id):
+        return f"product_updater:high_water:{category_id or 'all'}"
 
-                
-                for i in range(page_count, page_count + self.max_workers):
-                    if i not in futures:
-                        futures[i] = executor.submit(self.scrape_page, self._build_search_url(category_id, days, i), i)
+    def process_new_products(self, category_id=None, max_pages=None):
+        # Incremental mode: walk the newest listings first and stop at the first page made up
+        # entirely of listings we already store (or that are at or below the high-water mark)
+        key = self.high_water_key(category_id)
+        stored = self.state_model.get_state(key)
+        if stored is not None:
+            high_water = int(stored)
+        else:
+            # Without a bookmark only an unfiltered crawl can trust the newest stored listing
+            high_water = None if category_id else self.product_model.get_latest_listing_id() or None
+        newest = high_water or 0
 
-                page_count += 1
+        total_products = 0
+        page_count = 0
+        futures = {}
+        # Only move the mark once every newer listing has been stored
+        caught_up = False
+        # Pages are consumed in order here since the stop decision depends on it; keep a few in flight
+        window = min(self.max_workers, 3)
 
-        print(f"Completed updating product links. Total products processed: {total_products}")
+        while max_pages is None or page_count < max_pages:
+            for i in range(page_count, page_count + window):
+                if i not in futures and (max_pages is None or i < max_pages):
+                    futures[i] = self.fetcher.submit(self._build_search_url(category_id, None, i), timeout=10,
+                                                     stage='updater')
+
+            page = page_count
+            try:
+                response = futures.pop(page).result()
+                response.raise_for_status()
+            except HTTPError as e:
+                print(f"HTTP error {e.response.status_code} for {self._build_search_url(category_id, None, page)}")
+                break
+            except RequestError as e:
+                print(f"Request error: {e} for {self._build_search_url(category_id, None, page)}")
+                break
+
+            products = self.parse_page(response.content)
+            if products is None:
+                print(f"No products found for Category ID: {category_id}, Page: {page}")
+                caught_up = True
+                break
+
+            listing_ids = [product['listing_id'] for product in products]
+            newest = max(newest, *listing_ids)
+            unseen = {product_id for product_id in listing_ids if high_water is None or product_id > high_water}
+            unseen -= self.product_model.get_existing_listing_ids(unseen)
+            new_products = [product for product in products if product['listing_id'] in unseen]
+
+            if new_products:
+                if self.product_model.bulk_insert_products(new_products, use_copy=True) is None:
+                    # Not stored: stop without moving the high-water mark, so the next run retries
+                    break
+                total_products += len(new_products)
+            print(f"Found {len(new_products)} new products for Category ID: {category_id}, Page: {page}")
+
+            if not new_products:
+                print(f"Reached known listings on page {page}. Stopping.")
+                caught_up = True
+                break
+            page_count += 1
+
+        for future in futures.values():
+            future.cancel()
+
+        if caught_up and newest and newest != high_water:
+            self.state_model.set_state(key, newest)
+            high_water = newest
+        print(f"Completed incremental update. New products: {total_products}, high-water mark: {high_water}")
 
-    def run(self, category_id=None, days=None):
-        if category_id or days:
+    def run(self, category_id=None, days=None, incremental=False, max_pages=None):
+        if incremental:
+            self.process_new_products(category_id, max_pages)
+        elif category_id or days:
             self.process_products(category_id, days)
         else:
             print("No Category ID or Days provided. Exiting.")
 
     def close(self):
         self.product_model.close()
-        self.session.close()
\ No newline at end of file
+        self.category_model.close()
+        self.state_model.close()
@@ -0,0 +1,99 @@
+import os
+import time
+import asyncio
+
+
+class AdaptiveController:
+    # Additive-increase / multiplicative-decrease control of both in-flight requests and request
+    # rate, shared by every scraper through the fetcher. Each completed request that comes back
+    # healthy grows the limits by roughly one unit per round trip; a 429, a 5xx, a timeout or a
+    # response slower than latency_target cuts both limits by decrease_factor (at most once per
+    # cooldown, so one burst of failures counts as a single congestion signal).
+    # acquire()/release() must run on the fetcher's event loop; snapshot() is safe from any thread.
+    def __init__(self, initial_concurrency=None, min_concurrency=1, max_concurrency=None,
+                 initial_rate=None, min_rate=1.0, max_rate=None, latency_target=None,
+                 decrease_factor=0.5, cooldown=2.0):
+        self.max_concurrency = max_concurrency or int(os.getenv('FETCH_TOTAL_LIMIT', 200))
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(initial_concurrency or int(os.getenv('FETCH_INITIAL_CONCURRENCY', 10)))
+        self.max_rate = max_rate or float(os.getenv('FETCH_MAX_RATE', 100))
+        self.min_rate = min_rate
+        self.rate = float(initial_rate or float(os.getenv('FETCH_INITIAL_RATE', 10)))
+        self.latency_target = latency_target or float(os.getenv('FETCH_LATENCY_TARGET', 3.0))
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.tokens = 1.0
+        self.tokens_updated = time.monotonic()
+        self.last_decrease = 0.0
+        self.latency_ewma = None
+        self.counts = {'requests': 0, 'throttled': 0, 'server_errors': 0, 'timeouts': 0, 'slow': 0, 'decreases': 0}
+        self._condition = None
+
+    async def acquire(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.concurrency))
+            self.in_flight += 1
+        try:
+            await self._take_token()
+        except asyncio.CancelledError:
+            await self._release_slot()
+            raise
+
+    async def _release_slot(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def _take_token(self):
+        # Token bucket refilled at the current rate, holding at most one second of burst
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.tokens_updated) * self.rate)
+            self.tokens_updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def release(self, latency, status=None, timed_out=False):
+        self.counts['requests'] += 1
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+
+        congested = True
+        if timed_out:
+            self.counts['timeouts'] += 1
+        elif status == 429:
+            self.counts['throttled'] += 1
+        elif status is not None and status >= 500:
+            self.counts['server_errors'] += 1
+        elif latency > self.latency_target:
+            self.counts['slow'] += 1
+        else:
+            congested = False
+
+        if congested:
+            now = time.monotonic()
+            if now - self.last_decrease >= self.cooldown:
+                self.last_decrease = now
+                self.counts['decreases'] += 1
+                self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        else:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+
+        await self._release_slot()
+
+    def snapshot(self):
+        # Current limits and counters, for logging and monitoring
+        return {
+            'concurrency_limit': int(self.concurrency),
+            'rate_limit': round(self.rate, 2),
+            'in_flight': self.in_flight,
+            'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            **self.counts
+        }
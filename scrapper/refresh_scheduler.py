@@ -0,0 +1,43 @@
+import os
+from models.product_model import ProductModel
+from scrapper.product_detail_scraper import ProductDetailScraper
+
+
+class RefreshScheduler:
+    # Spends a request budget on the already-scraped listings most likely to have changed.
+    # Products are ranked by ProductModel.get_refresh_candidates (staleness, change history, age,
+    # site update date and errors) and handed to ProductDetailScraper in bounded batches.
+    def __init__(self, batch_size=None, min_interval_hours=None, detail_scraper=None):
+        self.product_model = ProductModel()
+        self.detail_scraper = detail_scraper or ProductDetailScraper()
+        self.batch_size = batch_size or int(os.getenv('REFRESH_BATCH_SIZE', 500))
+        self.min_interval_hours = min_interval_hours or float(os.getenv('REFRESH_MIN_INTERVAL_HOURS', 6))
+
+    def next_batch(self, limit=None):
+        return self.product_model.get_refresh_candidates(limit or self.batch_size, self.min_interval_hours)
+
+    def run(self, budget=None):
+        # budget: maximum number of products to refresh in this run (None = until nothing is due)
+        refreshed = 0
+        seen = set()
+        while budget is None or refreshed < budget:
+            limit = self.batch_size if budget is None else min(self.batch_size, budget - refreshed)
+            batch = self.next_batch(limit)
+            if not batch:
+                break
+            # Every product in the batch gets checked_at = NOW(), so it drops out of the next batch.
+            # Products whose result couldn't be written come back; each is refreshed once per run.
+            batch = [product for product in batch if product[0] not in seen]
+            if not batch:
+                print("No progress: the remaining candidates were already refreshed this run")
+                break
+            seen.update(product[0] for product in batch)
+            self.detail_scraper.scrape(batch)
+            refreshed += len(batch)
+            print(f"Refreshed {len(batch)} products ({refreshed} this run)")
+        print(f"Refresh complete. Products checked: {refreshed}")
+        return refreshed
+
+    def close(self):
+        self.product_model.close()
+        self.detail_scraper.close()
@@ -0,0 +1,118 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class ResponseCache:
+    # On-disk HTTP response cache keyed by URL. Bodies are stored compressed (zstd when the
+    # zstandard package is installed, gzip otherwise) next to a small JSON metadata file.
+    # Entries older than ttl seconds are ignored outside replay (ttl=0 keeps them forever), and
+    # the least recently used entries are evicted once the cache grows past max_bytes.
+    def __init__(self, directory, ttl=0, max_bytes=0):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(size for _, _, size in self._entries())
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return base + '.body', base + '.json'
+
+    def _entries(self):
+        # (last_used, body_path, size) for every cached body
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.body'):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    yield stat.st_mtime, path, stat.st_size
+
+    def get(self, url, ignore_ttl=False):
+        # Returns the cached (url, status_code, headers, content, history) or None
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+
+        if self.ttl and not ignore_ttl and time.time() - meta['stored_at'] > self.ttl:
+            return None
+
+        if meta['encoding'] == 'zstd':
+            if zstandard is None:
+                return None
+            content = zstandard.ZstdDecompressor().decompress(body)
+        else:
+            content = gzip.decompress(body)
+
+        # Touch the body so eviction treats it as recently used
+        os.utime(body_path)
+        return meta['url'], meta['status_code'], meta['headers'], content, meta.get('history', [])
+
+    def put(self, url, response):
+        body_path, meta_path = self._paths(url)
+        if zstandard is not None:
+            encoding, body = 'zstd', zstandard.ZstdCompressor().compress(response.content)
+        else:
+            encoding, body = 'gzip', gzip.compress(response.content, compresslevel=6)
+        meta = {
+            'url': response.url,
+            'status_code': response.status_code,
+            'headers': response.headers,
+            'history': response.history,
+            'encoding': encoding,
+            'stored_at': time.time()
+        }
+
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        previous = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+        # Write to temporary files and rename so readers never see a partial entry
+        for path, data, mode in ((body_path, body, 'wb'), (meta_path, json.dumps(meta), 'w')):
+            with open(path + '.tmp', mode) as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+
+        with self.lock:
+            self.size += len(body) - previous
+            if self.max_bytes and self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is 10% under its limit
+        target = self.max_bytes * 0.9
+        for _, path, size in sorted(self._entries()):
+            if self.size <= target:
+                break
+            for stale in (path, path[:-len('.body')] + '.json'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            self.size -= size
+
+
+def cache_from_env():
+    # HTTP_CACHE=on caches responses and serves hits, HTTP_CACHE=replay serves only from the cache
+    mode = os.getenv('HTTP_CACHE', 'off')
+    if mode == 'off':
+        return None, mode
+    cache = ResponseCache(
+        os.getenv('HTTP_CACHE_DIR', os.path.join(os.path.dirname(__file__), '..', '.http_cache')),
+        ttl=float(os.getenv('HTTP_CACHE_TTL', 86400)),
+        max_bytes=int(os.getenv('HTTP_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+    )
+    return cache, mode
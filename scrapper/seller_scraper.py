@@ -1,66 +1,155 @@
-import requests
 import os
-from bs4 import BeautifulSoup
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import sys
+import time
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
 from models.seller_model import SellerModel 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from scrapper.fetcher import RequestError
+from scrapper.parsers import parse_seller_response
+from common import metrics
+from common.runtime import get_runtime
+from scrapper.work import as_completed_from, worker_id, pipe
 
 class SellerScraper:
-    def __init__(self):
+    def __init__(self, parse_workers=None):
         self.seller_model = SellerModel()
-        self.base_url = os.getenv('BASE_URL')
-        self.headers = {"User-Agent": os.getenv('USER_AGENT')}
-        self.session = self._create_session()
+        self.base_url = get_runtime().base_url
+        self.fetcher = get_runtime().fetcher
+        self.chunk_size = 1000
+        self.max_pending = 500
+        # Parse pages in a process pool instead of the calling thread (0 = parse inline)
+        self.parse_workers = int(os.getenv('PARSE_WORKERS', 0)) if parse_workers is None else parse_workers
+        self.parse_pool = None
+        # Lease settings for running several seller scrapers against one database
+        self.worker_id = worker_id()
+        self.claim_size = 200
+        self.lease_seconds = 600
+        self.claimed = set()
+        self.renewed_at = None
+        # Parsed profiles are written back batch_size at a time during run()
+        self.batch_size = int(os.getenv('WRITER_BATCH_SIZE', 100))
+        self.batch = None
+        # Incremental runs refresh sellers not checked for this long
+        self.max_age_hours = float(os.getenv('SELLER_MAX_AGE_HOURS', 168))
 
-    def _create_session(self):
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        session.headers.update(self.headers)
-        return session
+    def seller_url(self, seller_id):
+        return f"{self.base_url}/index.php?page=profile&id={seller_id}"
     
-    def extract_seller_info(self, seller_id):
+    def save(self, seller_info):
+        # Buffer the profile while a run is batching, otherwise write it now
+        if self.batch is None:
+            self.seller_model.update_seller(seller_info)
+            return
+        self.batch.append(seller_info)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        try:
+            with metrics.timer('db_write_seconds', stage='seller'):
+                self.seller_model.update_sellers(batch)
+            metrics.inc('db_rows_written_total', len(batch), stage='seller')
+        except Exception as e:
+            metrics.inc('db_errors_total', stage='seller')
+            # Fall back to one transaction per seller so a single bad row doesn't sink the batch
+            print(f"Database Error during batch update of {len(batch)} sellers: {e}")
+            for seller_info in batch:
+                self.seller_model.update_seller(seller_info)
+
+    def submit(self, seller_id):
+        # Fetch the profile and, in pipeline mode, parse it in the process pool as soon as it arrives
+        future = self.fetcher.submit(self.seller_url(seller_id), timeout=10, stage='seller')
+        if self.parse_pool is not None:
+            future = pipe(future, self.parse_pool, parse_seller_response, seller_id)
+        return future
+
+    def extract_seller_info(self, seller_id, future=None):
         try: 
             print(f"Fetching Seller id: {seller_id}")
-            url = f"{self.base_url}/index.php?page=profile&id={seller_id}"
-            response = self.session.get(url, timeout=10)
+            if future is None:
+                future = self.submit(seller_id)
+            result = future.result()
 
-            if response.status_code != 200:
-                print(f"Failed to fetch seller {seller_id}, status code: {response.status_code}")
-                return None
+            # Pipeline mode resolves to the parsed seller, inline mode to the raw response
+            if self.parse_pool is not None:
+                seller_info = result
+                status_code = 200 if seller_info else 'unknown'
+            else:
+                seller_info = parse_seller_response(result, seller_id)
+                status_code = result.status_code
 
-            soup = BeautifulSoup(response.content, 'lxml')
-            
-            seller_info = {
-                "id": seller_id,
-                "image_src": "https://" + (soup.select_one('.bg-light .col.s6.l2 img[src]')['src'] if soup.select_one('.bg-light .col.s6.l2 img[src]') else ''),
-                "is_premium": bool(soup.select_one('.bg-light .col.s6.l4 img[alt="Premium Seller"]')),
-                "description": soup.select_one('.bg-light .col.s12.l6 p').get_text() if soup.select_one('.bg-light .col.s12.l6 p') else None,
-                "location": soup.select_one('.bg-light .col.s12.l6 p b:nth-child(1)').get_text() if soup.select_one('.bg-light .col.s12.l6 p b:nth-child(1)') else None,
-                "member_since": soup.select_one('.bg-light .col.s12.l6 p b:nth-child(2)').get_text() if soup.select_one('.bg-light .col.s12.l6 p b:nth-child(2)') else None,
-                "last_login": soup.select_one('.bg-light .col.s12.l6 p:nth-of-type(3) b').next_sibling.strip() if soup.select_one('.bg-light .col.s12.l6 p:nth-of-type(3) b') else None
-            }
+            metrics.inc('items_total', stage='seller', status='SCRAPED' if seller_info is not None else 'ERROR')
+            if seller_info is None:
+                print(f"Failed to fetch seller {seller_id}, status code: {status_code}")
+                return None
 
-            self.seller_model.update_seller(seller_info)
+            self.save(seller_info)
             return seller_info
 
-        except requests.RequestException as e:
+        except RequestError as e:
+            metrics.inc('item_errors_total', stage='seller', error=type(e).__name__)
             print(f"Error occurred while processing seller ID {seller_id}: {e}")
             return None
 
-    def run(self):
-        seller_ids = self.seller_model.fetch_seller_ids()
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            futures = [executor.submit(self.extract_seller_info, sid) for sid in seller_ids]
-            for future in as_completed(futures):
-                future.result()
+    def iter_seller_ids(self):
+        for chunk in self.seller_model.iter_seller_ids(self.chunk_size):
+            yield from chunk
+
+    def renew_leases(self):
+        # Extend the leases of claimed sellers still queued locally before they can expire
+        if self.renewed_at is None or time.monotonic() - self.renewed_at < self.lease_seconds / 3:
+            return
+        self.seller_model.renew_seller_leases(self.worker_id, self.claimed, self.lease_seconds)
+        self.renewed_at = time.monotonic()
 
+    def iter_claimed_seller_ids(self, since):
+        # Keep leasing sellers not refreshed since the pass started. Failed sellers keep their
+        # lease until it expires, so they are not re-claimed within the same pass.
+        while True:
+            self.renew_leases()
+            seller_ids = self.seller_model.claim_sellers(self.worker_id, self.claim_size, since, self.lease_seconds)
+            if not seller_ids:
+                return
+            if self.renewed_at is None:
+                self.renewed_at = time.monotonic()
+            self.claimed.update(seller_ids)
+            yield from seller_ids
+
+    def run(self, leased=False, incremental=False, max_age_hours=None):
+        # incremental=True only refreshes sellers never enriched or not checked within max_age_hours,
+        # sellers with the newest listings first
+        if leased:
+            seller_ids = self.iter_claimed_seller_ids(datetime.now(timezone.utc))
+        elif incremental:
+            seller_ids = self.seller_model.get_sellers_to_refresh(max_age_hours or self.max_age_hours)
+            print(f"{len(seller_ids)} sellers to refresh")
+        else:
+            seller_ids = self.iter_seller_ids()
+        self.scrape(seller_ids)
         print("Completed updating all sellers.")
 
+    def scrape(self, seller_ids):
+        # seller_ids: any iterable of ids, or a queue of them fed by another stage until work.END
+        self.batch = []
+        if self.parse_workers:
+            self.parse_pool = ProcessPoolExecutor(self.parse_workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            for sid, future in as_completed_from(self.submit, seller_ids, self.max_pending):
+                self.extract_seller_info(sid, future)
+                self.claimed.discard(sid)
+                self.renew_leases()
+        finally:
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown(cancel_futures=True)
+                self.parse_pool = None
+            self.flush()
+            self.batch = None
+            self.seller_model.release_sellers(self.worker_id, self.claimed)
+            self.claimed.clear()
+            self.renewed_at = None
+
     def close(self):
         self.seller_model.close()
-        self.session.close()
@@ -0,0 +1,90 @@
+import os
+import queue
+import socket
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+# Put on a stage queue to tell its consumer no more items are coming
+END = object()
+
+
+def bounded_as_completed(submit, items, max_pending):
+    # Submit work lazily from an iterable and yield (item, future) as each future completes.
+    # At most max_pending futures are outstanding, so memory stays flat however long items is.
+    items = iter(items)
+    pending = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < max_pending:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pending[submit(item)] = item
+
+        if not pending:
+            return
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+
+def streaming_as_completed(submit, source, max_pending, poll_interval=0.2):
+    # bounded_as_completed for a queue.Queue fed by another stage until it receives END. Unlike
+    # an iterator, an empty queue doesn't hold back futures that have already completed.
+    pending = {}
+    ended = False
+    while True:
+        while not ended and len(pending) < max_pending:
+            try:
+                # Block for new work only when nothing is in flight
+                item = source.get(block=not pending)
+            except queue.Empty:
+                break
+            if item is END:
+                ended = True
+                break
+            pending[submit(item)] = item
+
+        if not pending:
+            if ended:
+                return
+            continue
+
+        done, _ = wait(pending, timeout=None if ended else poll_interval, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+
+def as_completed_from(submit, items, max_pending):
+    # Stage queues stream, anything else is a finite iterable
+    if isinstance(items, queue.Queue):
+        return streaming_as_completed(submit, items, max_pending)
+    return bounded_as_completed(submit, items, max_pending)
+
+
+def worker_id():
+    # Identifies this process as a lease owner across machines
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def pipe(future, executor, fn, *args):
+    # Once future resolves, run fn(result, *args) on executor and return a future for its result.
+    # Used to hand fetched pages straight to a parse process pool without a thread in between.
+    result = Future()
+
+    def on_parsed(parse_future):
+        try:
+            result.set_result(parse_future.result())
+        except BaseException as e:
+            result.set_exception(e)
+
+    def on_fetched(fetch_future):
+        try:
+            executor.submit(fn, fetch_future.result(), *args).add_done_callback(on_parsed)
+        except BaseException as e:
+            result.set_exception(e)
+
+    future.add_done_callback(on_fetched)
+    return result
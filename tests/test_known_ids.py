@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+from models import known_ids
+from models.known_ids import KnownIds
+
+
+class FakeCursor:
+    # Answers the keyset queries of KnownIds._warm from a list of ids
+    def __init__(self, ids, queries):
+        self.ids = ids
+        self.queries = queries
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.queries.append(sql)
+        last_id, _, limit = params
+        ids = sorted(self.ids, reverse=True)
+        self.rows = [(id,) for id in ids if last_id is None or id < last_id][:limit]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakePool:
+    def __init__(self, ids):
+        self.ids = ids
+        self.queries = []
+
+    def getconn(self):
+        return SimpleNamespace(cursor=lambda: FakeCursor(self.ids, self.queries), rollback=lambda: None)
+
+    def putconn(self, conn):
+        pass
+
+
+def known(monkeypatch, ids, **kwargs):
+    pool = FakePool(ids)
+    monkeypatch.setattr(known_ids, 'get_runtime', lambda: SimpleNamespace(pool=pool))
+    return KnownIds('products', 'listing_id', **kwargs), pool
+
+
+def test_lookups_are_exact(monkeypatch):
+    cache, _ = known(monkeypatch, [5, 1, 9, 3], chunk_size=2)
+    assert 9 in cache and 1 in cache
+    assert 4 not in cache
+    assert cache.unknown([7, 3, 2, 9, 4]) == [7, 2, 4]
+    assert len(cache) == 4
+
+
+def test_cap_keeps_the_newest_ids(monkeypatch):
+    cache, pool = known(monkeypatch, list(range(1, 101)), max_size=30, chunk_size=7)
+    assert cache.unknown(range(1, 101)) == list(range(1, 71))
+    assert list(cache.ids) == list(range(71, 101))
+    assert all('DESC' in sql for sql in pool.queries)
+
+
+def test_added_ids_are_known_and_merged_in_order(monkeypatch):
+    cache, _ = known(monkeypatch, [10, 20])
+    cache.add([15, None, 10])
+    assert 15 in cache
+    assert cache.recent == {15}
+
+    cache.add(range(1000, 6000))
+    assert not cache.recent
+    assert list(cache.ids) == sorted(cache.ids)
+    assert cache.unknown([10, 15, 1000, 5999, 6000]) == [6000]
+
+
+def test_add_stops_at_the_cap(monkeypatch):
+    cache, _ = known(monkeypatch, [1, 2], max_size=4)
+    cache.add([3, 4, 5])
+    assert len(cache) == 4
+    assert 5 not in cache
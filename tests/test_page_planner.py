@@ -0,0 +1,63 @@
+from concurrent.futures import Future
+from scrapper.fetcher import Response
+from scrapper.page_planner import PagePlanner
+
+PAGE_SIZE = 10
+
+
+class FakeFetcher:
+    # Serves a listing of total products from already resolved futures and records which pages were requested
+    def __init__(self, total):
+        self.total = total
+        self.requested = []
+
+    def submit(self, url, timeout=None, stage=None):
+        page = int(url.split('=')[1])
+        self.requested.append(page)
+        count = max(0, min(PAGE_SIZE, self.total - page * PAGE_SIZE))
+        future = Future()
+        future.set_result(Response(url, 200, {}, str(count).encode()))
+        return future
+
+
+def crawl(total, product_count=None, skip_pages=()):
+    fetcher = FakeFetcher(total)
+    planner = PagePlanner(fetcher, lambda page: f"page={page}", lambda content: [None] * int(content),
+                          page_size=PAGE_SIZE, probe_window=3)
+    results = {page: (products, error) for page, products, error in planner.crawl(product_count, skip_pages)}
+    assert all(error is None for _, error in results.values())
+    found = sum(len(products) for products, _ in results.values() if products)
+    return sorted(fetcher.requested), found
+
+
+def test_exact_count_fetches_only_the_planned_pages():
+    assert crawl(25, product_count=25) == ([0, 1, 2], 25)
+
+
+def test_stale_low_count_probes_past_the_plan():
+    requested, found = crawl(45, product_count=15)
+    assert found == 45
+    assert requested[:5] == [0, 1, 2, 3, 4]
+
+
+def test_stale_high_count_stops_at_the_plan():
+    assert crawl(15, product_count=50) == ([0, 1, 2, 3, 4], 15)
+
+
+def test_exact_multiple_checks_one_page_past_the_plan():
+    assert crawl(20, product_count=20) == ([0, 1, 2], 20)
+
+
+def test_unknown_count_probes_until_a_partial_page():
+    requested, found = crawl(25)
+    assert found == 25
+    assert requested[:3] == [0, 1, 2]
+    assert max(requested) < 2 + 1 + 3
+
+
+def test_unknown_count_with_an_empty_listing():
+    assert crawl(0) == ([0, 1, 2], 0)
+
+
+def test_skipped_resume_pages_are_not_fetched():
+    assert crawl(25, product_count=25, skip_pages={0, 1}) == ([2], 5)
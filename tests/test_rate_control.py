@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from scrapper.rate_control import AdaptiveController
+
+
+def controller(**kwargs):
+    options = dict(initial_concurrency=10, max_concurrency=100, initial_rate=10, max_rate=100,
+                   latency_target=1.0, cooldown=60)
+    options.update(kwargs)
+    return AdaptiveController(**options)
+
+
+async def complete(control, latency=0.1, status=200, timed_out=False):
+    await control.acquire()
+    await control.release(latency, status, timed_out)
+
+
+def test_healthy_responses_grow_limits_additively():
+    control = controller(initial_rate=1000, max_rate=1000)
+
+    async def run():
+        for _ in range(10):
+            await complete(control)
+    asyncio.run(run())
+    assert 10.9 < control.concurrency <= 11
+    assert control.snapshot()['requests'] == 10
+
+
+@pytest.mark.parametrize('outcome', [{'status': 429}, {'status': 503}, {'timed_out': True}, {'latency': 5.0}])
+def test_congestion_cuts_both_limits(outcome):
+    control = controller()
+    asyncio.run(complete(control, **outcome))
+    assert control.concurrency == 5
+    assert control.rate == 5
+    assert control.snapshot()['decreases'] == 1
+
+
+def test_a_burst_of_failures_is_one_decrease_per_cooldown():
+    control = controller(initial_rate=1000, max_rate=1000)
+
+    async def run():
+        for _ in range(5):
+            await complete(control, status=429)
+    asyncio.run(run())
+    assert control.concurrency == 5
+    assert control.snapshot()['throttled'] == 5
+    assert control.snapshot()['decreases'] == 1
+
+
+def test_limits_stay_within_bounds():
+    control = controller(initial_concurrency=2, min_concurrency=1, max_concurrency=2, initial_rate=100,
+                         min_rate=40, max_rate=100, cooldown=0)
+
+    async def run():
+        for _ in range(5):
+            await complete(control, status=500)
+        assert (control.concurrency, control.rate) == (1, 40)
+        for _ in range(50):
+            await complete(control)
+    asyncio.run(run())
+    assert control.concurrency == 2
+    assert control.rate <= 100
+
+
+def test_acquire_waits_for_a_free_slot():
+    control = controller(initial_concurrency=2, initial_rate=1000, max_rate=1000)
+
+    async def run():
+        await control.acquire()
+        await control.acquire()
+        third = asyncio.ensure_future(control.acquire())
+        await asyncio.sleep(0.05)
+        assert not third.done()
+        await control.release(0.1, 200)
+        await asyncio.wait_for(third, 1)
+        assert control.in_flight == 2
+    asyncio.run(run())
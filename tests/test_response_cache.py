@@ -0,0 +1,61 @@
+import os
+import time
+from scrapper import response_cache
+from scrapper.fetcher import Response
+from scrapper.response_cache import ResponseCache
+
+
+def response(url, size=1000):
+    # Random bodies don't compress, so each entry takes about size bytes on disk
+    return Response(url, 200, {'Content-Type': 'text/html'}, os.urandom(size))
+
+
+def age(cache, url, seconds):
+    # Make an entry look last used seconds ago
+    body_path, _ = cache._paths(url)
+    when = time.time() - seconds
+    os.utime(body_path, (when, when))
+
+
+def test_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    stored = response('https://example.com/a')
+    cache.put('https://example.com/a', stored)
+    url, status_code, headers, content, history = cache.get('https://example.com/a')
+    assert (url, status_code, headers, content, history) == (stored.url, 200, stored.headers, stored.content, [])
+    assert cache.get('https://example.com/missing') is None
+
+
+def test_expired_entries_are_only_served_when_ignoring_ttl(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.put('https://example.com/a', response('https://example.com/a'))
+    assert cache.get('https://example.com/a') is not None
+
+    now = time.time()
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now + 61)
+    assert cache.get('https://example.com/a') is None
+    assert cache.get('https://example.com/a', ignore_ttl=True) is not None
+
+
+def test_eviction_drops_the_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=3500)
+    urls = [f'https://example.com/{i}' for i in range(3)]
+    for seconds, url in zip((30, 20, 10), urls):
+        cache.put(url, response(url))
+        age(cache, url, seconds)
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get(urls[0]) is not None
+
+    cache.put('https://example.com/new', response('https://example.com/new'))
+    assert cache.size <= 3500 * 0.9
+    assert cache.get(urls[1]) is None
+    assert cache.get(urls[0]) is not None
+    assert cache.get('https://example.com/new') is not None
+
+
+def test_size_is_recovered_when_reopened(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    for i in range(3):
+        cache.put(f'https://example.com/{i}', response(f'https://example.com/{i}'))
+    cache.put('https://example.com/0', response('https://example.com/0', size=500))
+    assert ResponseCache(str(tmp_path)).size == cache.size